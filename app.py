@@ -1,22 +1,22 @@
-from flask import Flask, render_template, request, send_file, jsonify
+from flask import Flask, render_template, request, send_file, jsonify, Response, stream_with_context
 from flask_cors import CORS
-from openai import OpenAI
 import os
 from dotenv import load_dotenv
 load_dotenv()  # Load environment variables from .env file
-import edge_tts
 import json
-import asyncio
-import whisper_timestamped as whisper
 import sys
 import logging
 import traceback
+import atexit
+import threading
 sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "utility"))
-from utility.script.script_generator import generate_script
-from utility.audio.audio_generator import generate_audio
-from utility.captions.timed_captions_generator import generate_timed_captions
-from utility.video.video_search_query_generator import getVideoSearchQueriesTimed, search_pexels_videos, merge_empty_intervals
-from utility.video.video_generator import create_video_from_videos
+from utility.jobs.job_queue import JobQueue, JOB_QUEUED, JOB_DONE, JOB_FAILED
+from utility.metrics import pipeline_metrics
+from utility.video.search_cache import search_cache
+from utility.script.script_cache import script_cache
+from utility.artifact_cache import artifact_cache
+from utility.video.render_profiles import parse_render_profiles
+from utility.video.encoder_profiles import parse_encoder_profile
 
 # Configure logging
 logging.basicConfig(
@@ -37,6 +37,37 @@ GROQ_API_KEY = os.getenv('GROQ_API_KEY')
 if not GROQ_API_KEY:
     raise ValueError("GROQ_API_KEY is not set in environment variables.")
 
+# Render worker pool configuration
+RENDER_WORKERS = int(os.getenv('RENDER_WORKERS', 2))
+JOBS_DIR = os.getenv('JOBS_DIR', 'jobs')
+OUTPUTS_DIR = os.getenv('OUTPUTS_DIR', 'outputs')
+BATCH_MAX_TOPICS = int(os.getenv('BATCH_MAX_TOPICS', 500))
+
+# Video downloads: published files never change, so clients may cache them
+VIDEO_CACHE_MAX_AGE = int(os.getenv('VIDEO_CACHE_MAX_AGE', 24 * 60 * 60))  # seconds
+# Let the front-end server send the file: X-Sendfile (Apache, lighttpd) or
+# X-Accel-Redirect to an internal nginx location that maps to OUTPUTS_DIR
+app.config['USE_X_SENDFILE'] = os.getenv('USE_X_SENDFILE', '').lower() in ('1', 'true', 'yes')
+X_ACCEL_REDIRECT_PREFIX = os.getenv('X_ACCEL_REDIRECT_PREFIX')
+
+# Hit and miss counters of the caches every worker shares, exported on /metrics
+pipeline_metrics.register_cache('search', search_cache)
+pipeline_metrics.register_cache('script', script_cache)
+pipeline_metrics.register_cache('artifact', artifact_cache)
+
+job_queue = None
+job_queue_lock = threading.Lock()
+
+def get_job_queue():
+    """Start the render worker pool on first use so the debug reloader's parent process does not spawn one."""
+    global job_queue
+    with job_queue_lock:
+        if job_queue is None:
+            job_queue = JobQueue(num_workers=RENDER_WORKERS, jobs_dir=JOBS_DIR, outputs_dir=OUTPUTS_DIR)
+            job_queue.start()
+            atexit.register(job_queue.shutdown)
+    return job_queue
+
 @app.route('/')
 def index():
     logger.info("Serving index page")
@@ -76,82 +107,27 @@ def generate_video():
             return jsonify({"error": error_msg}), 400
             
         topic = data['topic']
-        
-        logger.info(f"Starting video generation for topic: {topic}")
-        
-        # Generate the script
-        logger.info("Generating script...")
-        try:
-            response = generate_script(topic)
-            logger.info("Script generated successfully")
-        except Exception as e:
-            logger.error(f"Error generating script: {str(e)}")
-            logger.error(traceback.format_exc())
-            return jsonify({"error": f"Error generating script: {str(e)}"}), 500
-
-        # Generate audio from the script
-        logger.info("Generating audio...")
-        try:
-            audio_path = generate_audio(response)
-            logger.info(f"Audio generated successfully: {audio_path}")
-        except Exception as e:
-            logger.error(f"Error generating audio: {str(e)}")
-            logger.error(traceback.format_exc())
-            return jsonify({"error": f"Error generating audio: {str(e)}"}), 500
-
-        # Generate and save timed captions
-        logger.info("Generating timed captions...")
+        if not isinstance(topic, str) or not topic.strip():
+            return jsonify({"error": "topic must be a non-empty string"}), 400
+        topic = topic.strip()
         try:
-            captions_timed = generate_timed_captions(audio_path)
-            with open("captions_timed.txt", "w", encoding="utf-8") as f:
-                f.write(str(captions_timed))
-            logger.info("Timed captions generated successfully")
-        except Exception as e:
-            logger.error(f"Error generating captions: {str(e)}")
-            logger.error(traceback.format_exc())
-            return jsonify({"error": f"Error generating captions: {str(e)}"}), 500
-
-        # Get video search queries
-        logger.info("Generating video search queries...")
-        try:
-            search_queries = getVideoSearchQueriesTimed(response, captions_timed)
-        except Exception as e:
-            logger.error(f"Error generating search queries: {str(e)}")
-            logger.error(traceback.format_exc())
-            return jsonify({"error": f"Error generating search queries: {str(e)}"}), 500
-
-        # Search for videos and create segments
-        logger.info("Searching for videos...")
-        try:
-            segments = []
-            for time_segment, queries in search_queries:
-                url = None
-                for query in queries:
-                    url = search_pexels_videos(query)
-                    if url:
-                        break
-                segments.append([time_segment, url])
-
-            # Merge segments with no videos
-            segments = merge_empty_intervals(segments)
-        except Exception as e:
-            logger.error(f"Error searching for videos: {str(e)}")
-            logger.error(traceback.format_exc())
-            return jsonify({"error": f"Error searching for videos: {str(e)}"}), 500
-
-        # Create the final video
-        logger.info("Creating final video...")
-        try:
-            output_path = "rendered_video.mp4"
-            create_video_from_videos(segments, audio_path, output_path)
-            logger.info(f"Video rendering complete: {output_path}")
-        except Exception as e:
-            logger.error(f"Error creating video: {str(e)}")
-            logger.error(traceback.format_exc())
-            return jsonify({"error": f"Error creating video: {str(e)}"}), 500
+            profiles = parse_render_profiles(data.get('profiles'))
+            encoder_profile = parse_encoder_profile(data.get('encoder_profile'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        # An edited script to render instead of generating one
+        script = data.get('script')
+        if script is not None and (not isinstance(script, str) or not script.strip()):
+            return jsonify({"error": "script must be a non-empty string"}), 400
         
-        logger.info("Sending video file response")
-        return send_file(output_path, mimetype='video/mp4')
+        job_id = get_job_queue().submit(topic, profiles=profiles, script=script, encoder_profile=encoder_profile)
+        return jsonify({
+            "job_id": job_id,
+            "status": JOB_QUEUED,
+            "status_url": f"/jobs/{job_id}",
+            "result_url": f"/jobs/{job_id}/result",
+            "video_url": f"/jobs/{job_id}/video"
+        }), 202
         
     except Exception as e:
         error_message = f"Unexpected error: {str(e)}"
@@ -159,10 +135,162 @@ def generate_video():
         logger.error(traceback.format_exc())
         return jsonify({"error": error_message}), 500
 
+@app.route('/generate/batch', methods=['POST'])
+def generate_batch():
+    data = request.get_json(silent=True)
+    topics = data.get('topics') if isinstance(data, dict) else None
+    if not isinstance(topics, list) or not topics or not all(isinstance(topic, str) and topic.strip() for topic in topics):
+        return jsonify({"error": "topics must be a non-empty list of topic strings"}), 400
+    if len(topics) > BATCH_MAX_TOPICS:
+        return jsonify({"error": f"A batch can have at most {BATCH_MAX_TOPICS} topics"}), 400
+    try:
+        profiles = parse_render_profiles(data.get('profiles'))
+        encoder_profile = parse_encoder_profile(data.get('encoder_profile'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        queue = get_job_queue()
+        batch_id = queue.submit_batch([topic.strip() for topic in topics], profiles=profiles,
+                                      encoder_profile=encoder_profile)
+        batch = queue.get_batch(batch_id)
+        return jsonify({
+            "batch_id": batch_id,
+            "status_url": f"/batches/{batch_id}",
+            "stream_url": f"/batches/{batch_id}/stream",
+            "topics": [
+                dict(entry, status_url=f"/jobs/{entry['job_id']}", result_url=f"/jobs/{entry['job_id']}/result",
+                     video_url=f"/jobs/{entry['job_id']}/video")
+                for entry in batch['topics']
+            ]
+        }), 202
+    except Exception as e:
+        error_message = f"Unexpected error: {str(e)}"
+        logger.error(error_message)
+        logger.error(traceback.format_exc())
+        return jsonify({"error": error_message}), 500
+
+@app.route('/batches/<batch_id>', methods=['GET'])
+def get_batch(batch_id):
+    batch = get_job_queue().get_batch(batch_id)
+    if batch is None:
+        return jsonify({"error": "Batch not found"}), 404
+    jobs = [job_status(job) for job in batch['jobs']]
+    counts = {}
+    for job in jobs:
+        counts[job['status']] = counts.get(job['status'], 0) + 1
+    return jsonify({
+        "batch_id": batch_id,
+        "created_at": batch['created_at'],
+        "topics": batch['topics'],
+        "counts": counts,
+        "jobs": jobs
+    })
+
+@app.route('/batches/<batch_id>/stream', methods=['GET'])
+def stream_batch(batch_id):
+    """Newline-delimited JSON: one job status line per job as it finishes, or fails when its worker dies."""
+    queue = get_job_queue()
+    batch = queue.get_batch(batch_id)
+    if batch is None:
+        return jsonify({"error": "Batch not found"}), 404
+
+    def generate():
+        for job in queue.wait_finished(batch['job_ids']):
+            yield json.dumps(job_status(job)) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def job_status(job):
+    status = {
+        "job_id": job['job_id'],
+        "topic": job['topic'],
+        "batch_id": job.get('batch_id'),
+        "status": job['status'],
+        "stage": job['stage'],
+        "encoder_profile": job.get('encoder_profile'),
+        "created_at": job['created_at'],
+        "started_at": job['started_at'],
+        "finished_at": job['finished_at']
+    }
+    if job['status'] == JOB_DONE:
+        status["result_url"] = f"/jobs/{job['job_id']}/result"
+        status["video_url"] = f"/jobs/{job['job_id']}/video"
+        status["videos"] = {profile: f"/jobs/{job['job_id']}/video?profile={profile}" for profile in job['outputs']}
+    if job['status'] == JOB_FAILED:
+        status["error"] = job['error']
+    return status
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job_status(job))
+
+def send_video(path, download_name):
+    """Send a published video with Range, ETag and If-None-Match / If-Range support."""
+    if X_ACCEL_REDIRECT_PREFIX:
+        # nginx serves the file, including ranges and conditional requests
+        response = Response(mimetype='video/mp4')
+        response.headers['X-Accel-Redirect'] = f"{X_ACCEL_REDIRECT_PREFIX.rstrip('/')}/{os.path.basename(path)}"
+        return response
+    return send_file(path, mimetype='video/mp4', conditional=True, etag=True,
+                     max_age=VIDEO_CACHE_MAX_AGE, download_name=download_name,
+                     as_attachment=request.args.get('download') == '1')
+
+@app.route('/jobs/<job_id>/video', methods=['GET'])
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def get_job_video(job_id):
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    if job['status'] == JOB_FAILED:
+        return jsonify({"error": job['error']}), 500
+    if job['status'] != JOB_DONE:
+        return jsonify({"error": "Job is not finished yet", "status": job['status']}), 409
+    profile = request.args.get('profile')
+    if profile and profile not in job['outputs']:
+        return jsonify({"error": f"Job was not rendered in profile '{profile}'", "profiles": list(job['outputs'])}), 404
+    path = job['outputs'][profile] if profile else job['output_path']
+    if not os.path.exists(path):
+        return jsonify({"error": "Video is no longer available"}), 410
+
+    logger.info(f"Sending video file for job {job_id} (range: {request.headers.get('Range', 'none')})")
+    return send_video(os.path.abspath(path), os.path.basename(path))
+
+@app.route('/jobs/<job_id>/metrics', methods=['GET'])
+def get_job_metrics(job_id):
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify({
+        "job_id": job_id,
+        "status": job['status'],
+        "stages": job['timings'],
+        "total_wall_seconds": sum(timing['wall_seconds'] for timing in job['timings'])
+    })
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(pipeline_metrics.render(), mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
     logger.info("Starting server on http://127.0.0.1:5000")
     logger.info("Available routes:")
     logger.info("  / - Main page")
     logger.info("  /generate - Video generation endpoint (POST)")
+    logger.info("  /generate/batch - Generate videos for a list of topics (POST)")
+    logger.info("  /batches/<id> - Batch status (GET)")
+    logger.info("  /batches/<id>/stream - Batch jobs as they finish, as NDJSON (GET)")
+    logger.info("  /jobs/<id> - Job status (GET)")
+    logger.info("  /jobs/<id>/video - Rendered video for a finished job, with range requests; ?profile= picks a format (GET)")
+    logger.info("  /jobs/<id>/result - Alias of /jobs/<id>/video (GET)")
+    logger.info("  /jobs/<id>/metrics - Per-stage timings for a job (GET)")
+    logger.info("  /metrics - Prometheus stage metrics (GET)")
     
+    # Start the workers, and their Whisper warm-up, before the first request arrives.
+    # Under the debug reloader only the serving child process (WERKZEUG_RUN_MAIN) runs them.
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        get_job_queue()
     app.run(debug=True)
@@ -0,0 +1,87 @@
+"""Generate videos for many topics in one batch without the web server.
+
+Topics come from the command line and/or a file with one topic per line.
+Identical topics are rendered once, and each video is moved into the output
+directory, named after its topic, as soon as it finishes. Example:
+
+    python batch_generate.py --topics-file trending.txt --workers 4 --output-dir videos
+"""
+import os
+import re
+import sys
+import json
+import logging
+import argparse
+from dotenv import load_dotenv
+
+load_dotenv()  # Load environment variables from .env file
+
+from utility.jobs.job_queue import JobQueue, JOB_DONE
+from utility.video.render_profiles import RENDER_PROFILES, DEFAULT_RENDER_PROFILES, parse_render_profiles
+from utility.video.encoder_profiles import ENCODER_PROFILES, DEFAULT_ENCODER_PROFILE, parse_encoder_profile
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def read_topics(args):
+    topics = list(args.topics)
+    if args.topics_file:
+        with open(args.topics_file, encoding="utf-8") as f:
+            topics.extend(line.strip() for line in f if line.strip() and not line.startswith('#'))
+    return topics
+
+def output_name(topic):
+    return re.sub(r'[^\w]+', '_', topic.lower()).strip('_')[:80] or "video"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('topics', nargs='*', help="topics to generate videos for")
+    parser.add_argument('--topics-file', help="file with one topic per line")
+    parser.add_argument('--workers', type=int, default=int(os.getenv('RENDER_WORKERS', 2)),
+                        help="number of render worker processes")
+    parser.add_argument('--jobs-dir', default=os.getenv('JOBS_DIR', 'jobs'), help="working directory for jobs")
+    parser.add_argument('--profiles', default=DEFAULT_RENDER_PROFILES,
+                        help=f"comma-separated render profiles ({', '.join(RENDER_PROFILES)})")
+    parser.add_argument('--encoder', default=DEFAULT_ENCODER_PROFILE,
+                        help=f"encoder profile ({', '.join(ENCODER_PROFILES)})")
+    parser.add_argument('--output-dir', default="videos", help="where finished videos are written")
+    args = parser.parse_args()
+
+    topics = read_topics(args)
+    if not topics:
+        parser.error("no topics given")
+    try:
+        profiles = parse_render_profiles(args.profiles)
+        encoder_profile = parse_encoder_profile(args.encoder)
+    except ValueError as e:
+        parser.error(str(e))
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    queue = JobQueue(num_workers=args.workers, jobs_dir=args.jobs_dir, outputs_dir=args.output_dir)
+    queue.start()
+    failed = 0
+    try:
+        batch = queue.get_batch(queue.submit_batch(topics, profiles=profiles, encoder_profile=encoder_profile))
+        topics_by_job = {}
+        for entry in batch['topics']:
+            topics_by_job.setdefault(entry['job_id'], []).append(entry['topic'])
+
+        for job in queue.wait_finished(batch['job_ids']):
+            result = {'job_id': job['job_id'], 'topics': topics_by_job[job['job_id']], 'status': job['status']}
+            if job['status'] == JOB_DONE:
+                result['videos'] = {}
+                for profile, path in job['outputs'].items():
+                    suffix = f"_{profile}" if len(profiles) > 1 else ""
+                    result['videos'][profile] = os.path.join(args.output_dir, output_name(job['topic']) + suffix + ".mp4")
+                    os.replace(path, result['videos'][profile])
+            else:
+                result['error'] = job['error']
+                failed += 1
+            # One JSON line per finished job, for piping into other tools
+            print(json.dumps(result), flush=True)
+    finally:
+        queue.shutdown()
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
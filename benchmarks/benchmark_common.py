@@ -0,0 +1,58 @@
+"""Helpers shared by the benchmark scripts: generated inputs, timed renders and result output."""
+import os
+import sys
+import json
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+def generate_sample_clips(clips_dir, count, seconds, size="1920x1080", hue_step=None):
+    """Write count testsrc2 MP4s of the given length, each in its own hue, and return their paths."""
+    from utility.video.clip_normalizer import run_ffmpeg
+    os.makedirs(clips_dir, exist_ok=True)
+    hue_step = hue_step if hue_step is not None else 360 // count
+    paths = []
+    for i in range(count):
+        path = os.path.join(clips_dir, f"clip_{i}.mp4")
+        run_ffmpeg([
+            '-f', 'lavfi', '-i', f"testsrc2=size={size}:rate=25,hue=h={i * hue_step}",
+            '-t', str(seconds), '-c:v', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p', path
+        ], f"generate sample clip {i}")
+        paths.append(path)
+    return paths
+
+def generate_audio(path, seconds, source='anullsrc=r=24000:cl=mono'):
+    """Write an MP3 of the given length from an ffmpeg lavfi audio source and return its path."""
+    from utility.video.clip_normalizer import run_ffmpeg
+    run_ffmpeg([
+        '-f', 'lavfi', '-i', source, '-t', f"{seconds:.3f}", '-c:a', 'libmp3lame', '-b:a', '48k', path
+    ], "generate audio")
+    return path
+
+def local_segments(clips, num_segments, seconds, overlap=0.0):
+    """Segments that cycle through the local clips, and the URL -> path map a LocalClips needs."""
+    segments = [
+        [[i * seconds, (i + 1) * seconds + overlap], f"file://{clips[i % len(clips)]}"]
+        for i in range(num_segments)
+    ]
+    return segments, {url: url[len("file://"):] for _, url in segments}
+
+def timed_render(segments, paths, audio_path, output_path, **kwargs):
+    """Render local segments with create_video_from_videos and return seconds taken, success and output size."""
+    from utility.video.video_generator import create_video_from_videos, LocalClips
+    started = time.perf_counter()
+    rendered = create_video_from_videos(segments, audio_path, output_path, prefetcher=LocalClips(paths), **kwargs)
+    ok = rendered is not None and os.path.exists(output_path)
+    return {
+        'seconds': time.perf_counter() - started,
+        'ok': ok,
+        'bytes': os.path.getsize(output_path) if ok else 0,
+    }
+
+def write_json(path, results):
+    """Write results to path when --json was given."""
+    if path:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
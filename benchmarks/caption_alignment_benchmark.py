@@ -0,0 +1,105 @@
+"""Micro-benchmark for caption timestamp alignment in timed_captions_generator.
+
+Builds a synthetic Whisper result, checks that getCaptionsWithTime returns
+exactly what the previous dict-scan implementation returned, and times both.
+Example:
+
+    python benchmarks/caption_alignment_benchmark.py --words 20000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from utility.captions.timed_captions_generator import getCaptionsWithTime, cleanWord
+
+VOCABULARY = ("stars", "galaxy", "the", "of", "scientists", "discovered", "light", "years", "away",
+              "Interesting", "facts", "about", "space", "isn't", "it?", "planets", "orbit", "a", "sun.")
+
+def synthetic_whisper_result(num_words, seed=0):
+    rng = random.Random(seed)
+    segments = []
+    words = []
+    t = 0.0
+    for i in range(num_words):
+        duration = rng.uniform(0.15, 0.6)
+        words.append({'text': rng.choice(VOCABULARY), 'start': round(t, 2), 'end': round(t + duration, 2)})
+        t += duration
+        if len(words) == 30 or i == num_words - 1:
+            segments.append({'words': words})
+            words = []
+    text = ' ' + ' '.join(word['text'] for segment in segments for word in segment['words'])
+    return {'text': text, 'segments': segments}
+
+# Previous implementation, kept here as the reference output
+
+def reference_split_words_by_size(words, maxCaptionSize):
+    halfCaptionSize = maxCaptionSize / 2
+    captions = []
+    while words:
+        caption = words[0]
+        words = words[1:]
+        while words and len(caption + ' ' + words[0]) <= maxCaptionSize:
+            caption += ' ' + words[0]
+            words = words[1:]
+            if len(caption) >= halfCaptionSize and words:
+                break
+        captions.append(caption)
+    return captions
+
+def reference_captions_with_time(whisper_analysis, maxCaptionSize=15):
+    index = 0
+    locationToTimestamp = {}
+    for segment in whisper_analysis['segments']:
+        for word in segment['words']:
+            newIndex = index + len(word['text']) + 1
+            locationToTimestamp[(index, newIndex)] = word['end']
+            index = newIndex
+
+    def interpolate(word_position):
+        for key, value in locationToTimestamp.items():
+            if key[0] <= word_position <= key[1]:
+                return value
+        return None
+
+    position = 0
+    start_time = 0
+    CaptionsPairs = []
+    words = [cleanWord(word) for word in whisper_analysis['text'].split()]
+    for word in reference_split_words_by_size(words, maxCaptionSize):
+        position += len(word) + 1
+        end_time = interpolate(position)
+        if end_time and word:
+            CaptionsPairs.append(((start_time, end_time), word))
+            start_time = end_time
+    return CaptionsPairs
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--words', type=int, default=20000, help="number of words in the synthetic transcript")
+    parser.add_argument('--skip-reference', action='store_true', help="only time the current implementation")
+    args = parser.parse_args()
+
+    whisper_result = synthetic_whisper_result(args.words)
+    captions, seconds = timed(getCaptionsWithTime, whisper_result)
+    print(f"getCaptionsWithTime: {args.words} words -> {len(captions)} captions in {seconds * 1000:.1f} ms")
+
+    if not args.skip_reference:
+        reference, reference_seconds = timed(reference_captions_with_time, whisper_result)
+        print(f"reference:           {args.words} words -> {len(reference)} captions in {reference_seconds * 1000:.1f} ms")
+        if captions != reference:
+            print("MISMATCH: outputs differ from the reference implementation")
+            sys.exit(1)
+        print(f"Outputs identical; speed-up {reference_seconds / seconds:.1f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""Render throughput of each encoder profile.
+
+Renders the same segments once per encoder profile, with --concurrent renders
+running side by side as the render workers would, and reports renders per
+minute, seconds of video encoded per wall-clock second and output size. Each
+render gets its own empty artifact store, so no normalized segment is reused.
+Encoder threads are divided between the concurrent renders unless
+--encoder-threads is set. Example:
+
+    python benchmarks/encoder_profile_benchmark.py --concurrent 1,2
+"""
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import multiprocessing
+from benchmark_common import generate_sample_clips, generate_audio, local_segments, timed_render, write_json
+
+SAMPLE_CLIPS = 4
+SEGMENT_SECONDS = 2.0
+
+def generate_inputs(work_dir, num_segments):
+    clips = generate_sample_clips(work_dir, SAMPLE_CLIPS, SEGMENT_SECONDS + 1)
+    audio_path = generate_audio(os.path.join(work_dir, "audio.mp3"), num_segments * SEGMENT_SECONDS,
+                                source='sine=frequency=440:sample_rate=24000')
+    return clips, audio_path
+
+def render_once(encoder_profile, concurrent, encoder_threads, num_segments, clips, audio_path, render_dir,
+                width, height, result_queue):
+    # Spawned, so configuration read at import time can be set first
+    os.environ['ARTIFACT_STORE_DIR'] = os.path.join(render_dir, 'artifacts')
+    os.environ['ENCODER_THREADS'] = str(encoder_threads)
+    from utility.video.encoder_profiles import encoder_settings, set_render_concurrency
+
+    set_render_concurrency(concurrent)
+    encoder = encoder_settings(encoder_profile)
+    segments, paths = local_segments(clips, num_segments, SEGMENT_SECONDS)
+    render = timed_render(segments, paths, audio_path, os.path.join(render_dir, "output.mp4"),
+                          width=width, height=height, encoder=encoder)
+    result_queue.put(dict(render, threads=encoder['threads']))
+
+def run_profile(encoder_profile, concurrent, args, clips, audio_path, work_dir):
+    context = multiprocessing.get_context('spawn')
+    result_queue = context.Queue()
+    processes = []
+    started = time.perf_counter()
+    for i in range(concurrent):
+        render_dir = os.path.join(work_dir, f"{encoder_profile}_{concurrent}_{i}")
+        os.makedirs(render_dir)
+        process = context.Process(target=render_once, args=(
+            encoder_profile, concurrent, args.encoder_threads, args.segments, clips, audio_path, render_dir,
+            args.width, args.height, result_queue))
+        process.start()
+        processes.append(process)
+    renders = [result_queue.get() for _ in processes]
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - started
+    video_seconds = args.segments * SEGMENT_SECONDS * len(renders)
+    return {
+        'encoder_profile': encoder_profile,
+        'concurrent': concurrent,
+        'ok': all(render['ok'] for render in renders),
+        'elapsed_seconds': elapsed,
+        'renders_per_minute': len(renders) / elapsed * 60,
+        'realtime_factor': video_seconds / elapsed,
+        'mean_output_bytes': sum(render['bytes'] for render in renders) / len(renders),
+        'threads_per_encode': renders[0]['threads'],
+    }
+
+def main():
+    from utility.video.encoder_profiles import ENCODER_PROFILES
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--profiles', default=','.join(ENCODER_PROFILES), help="comma-separated encoder profiles")
+    parser.add_argument('--concurrent', default="1,2", help="comma-separated numbers of renders run side by side")
+    parser.add_argument('--segments', type=int, default=8, help=f"{SEGMENT_SECONDS:g} s segments per render")
+    parser.add_argument('--encoder-threads', type=int, default=0,
+                        help="threads per encode; 0 divides the CPUs between concurrent renders")
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args()
+
+    profiles = [profile.strip() for profile in args.profiles.split(',')]
+    counts = [int(count) for count in args.concurrent.split(',')]
+    work_dir = tempfile.mkdtemp(prefix="encoder_profile_benchmark_")
+    results = []
+    try:
+        clips, audio_path = generate_inputs(work_dir, args.segments)
+        print(f"{'profile':<10}{'concurrent':>11}{'threads':>9}{'elapsed s':>11}{'renders/min':>13}"
+              f"{'x realtime':>12}{'MB':>8}")
+        for concurrent in counts:
+            for profile in profiles:
+                result = run_profile(profile, concurrent, args, clips, audio_path, work_dir)
+                results.append(result)
+                print(f"{profile:<10}{concurrent:>11}{result['threads_per_encode']:>9}"
+                      f"{result['elapsed_seconds']:>11.1f}{result['renders_per_minute']:>13.2f}"
+                      f"{result['realtime_factor']:>12.2f}{result['mean_output_bytes'] / 2**20:>8.1f}"
+                      f"{'' if result['ok'] else '  FAILED'}", flush=True)
+        write_json(args.json, results)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,288 @@
+"""Offline end-to-end benchmark for the video generation pipeline.
+
+Runs the real pipeline from utility/pipeline.py through the render worker pool,
+with every external service replaced by a local stand-in:
+
+- Gemini: a stub model that returns a fixed script
+- edge-tts: slices of the canned audio_tts.wav from the repository, with word
+  boundaries taken from captions_timed.txt
+- Whisper (CAPTION_MODE=whisper): the same word timings, cut to the slice of
+  audio each call transcribes
+- Pexels: a local HTTP server that answers Pexels-shaped search JSON and
+  serves generated sample MP4s
+
+Reports per-stage latency, jobs per minute at the given concurrency and peak
+memory. Example:
+
+    python benchmarks/pipeline_benchmark.py --jobs 8 --concurrency 4
+"""
+import os
+import ast
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+from benchmark_common import REPO_ROOT, generate_sample_clips, write_json
+
+CANNED_AUDIO = os.path.join(REPO_ROOT, "audio_tts.wav")
+CANNED_CAPTIONS = os.path.join(REPO_ROOT, "captions_timed.txt")
+BENCHMARK_TOPIC = "stars"
+SAMPLE_CLIPS = 6
+SAMPLE_CLIP_SECONDS = 6
+MP3_FRAME_BYTES = 144  # 576 samples at 24 kHz and 48 kbit/s
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+def fixed_whisper_result():
+    """Whisper-shaped transcription of audio_tts.wav, spreading each caption's time over its words."""
+    with open(CANNED_CAPTIONS, encoding="utf-8") as f:
+        captions = ast.literal_eval(f.read())
+    words = []
+    for (start, end), text in captions:
+        caption_words = text.split()
+        step = (end - start) / len(caption_words)
+        for i, word in enumerate(caption_words):
+            words.append({'text': word, 'start': round(start + i * step, 2), 'end': round(start + (i + 1) * step, 2)})
+    return {'text': ' '.join(word['text'] for word in words), 'segments': [{'words': words}]}
+
+def start_fake_pexels(clips_dir):
+    """Serve Pexels-shaped search results and the sample clips; returns (server, base_url)."""
+
+    class FakePexelsHandler(SimpleHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # Keep-alive, like the real API and CDN
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, directory=clips_dir, **kwargs)
+
+        def do_GET(self):
+            parsed = urlparse(self.path)
+            if parsed.path != '/videos/search':
+                return super().do_GET()
+            query = parse_qs(parsed.query).get('query', [''])[0]
+            per_page = int(parse_qs(parsed.query).get('per_page', ['1'])[0])
+            first = int(hashlib.md5(query.encode('utf-8')).hexdigest(), 16) % SAMPLE_CLIPS
+            videos = []
+            for n in range(per_page):
+                clip = (first + n) % SAMPLE_CLIPS
+                videos.append({
+                    'id': clip,
+                    'width': 1920,
+                    'height': 1080,
+                    'duration': SAMPLE_CLIP_SECONDS,
+                    'video_files': [{'width': 1920, 'height': 1080, 'link': f"{base_url}/clip_{clip}.mp4"}]
+                })
+            body = json.dumps({'videos': videos}).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakePexelsHandler)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, base_url
+
+def install_fakes(pexels_url):
+    """Swap the external services for local stand-ins; worker processes inherit them when forked."""
+    import edge_tts
+    import utility.script.script_generator as script_generator
+    import utility.captions.timed_captions_generator as timed_captions_generator
+    import utility.video.async_video_search as async_video_search
+    from utility.audio.audio_generator import TTS_BITRATE, TICKS_PER_SECOND, split_script
+
+    class FakeGenerativeModel:
+        def __init__(self, model_name):
+            pass
+
+        def generate_content(self, prompt):
+            class Response:
+                text = script_generator.get_fallback_script(BENCHMARK_TOPIC)
+            return Response()
+
+    script = script_generator.get_fallback_script(BENCHMARK_TOPIC)
+    with open(CANNED_AUDIO, 'rb') as f:
+        canned_audio = f.read()
+    whisper_result = fixed_whisper_result()
+
+    def chunk_bytes(text):
+        """Byte range of the canned audio for a script chunk, in proportion to where the text sits."""
+        start_char = max(0, script.find(text))
+        end_char = min(start_char + len(text), len(script))
+        frames = len(canned_audio) // MP3_FRAME_BYTES
+        return (frames * start_char // len(script) * MP3_FRAME_BYTES,
+                frames * end_char // len(script) * MP3_FRAME_BYTES)
+
+    def chunk_words(text):
+        """Canned words spoken within a script chunk, timed from the start of the chunk."""
+        start_byte, end_byte = chunk_bytes(text)
+        start, end = start_byte * 8 / TTS_BITRATE, end_byte * 8 / TTS_BITRATE
+        return [
+            dict(word, start=round(word['start'] - start, 2), end=round(word['end'] - start, 2))
+            for segment in whisper_result['segments'] for word in segment['words']
+            if start <= word['start'] < end
+        ]
+
+    class FakeCommunicate:
+        def __init__(self, text, voice, **kwargs):
+            self.text = text
+
+        async def stream(self):
+            start_byte, end_byte = chunk_bytes(self.text)
+            yield {'type': 'audio', 'data': canned_audio[start_byte:end_byte]}
+            for word in chunk_words(self.text):
+                yield {'type': 'WordBoundary', 'text': word['text'], 'offset': int(word['start'] * TICKS_PER_SECOND),
+                       'duration': int((word['end'] - word['start']) * TICKS_PER_SECOND)}
+
+    def fake_transcribe(model, audio, **kwargs):
+        # Chunk files are numbered in script order
+        index = int(os.path.splitext(audio)[0].rsplit('_', 1)[-1])
+        words = chunk_words(split_script(script)[index])
+        return {'text': ' '.join(word['text'] for word in words), 'segments': [{'words': words}]}
+
+    script_generator.genai.GenerativeModel = FakeGenerativeModel
+    edge_tts.Communicate = FakeCommunicate
+    timed_captions_generator.load_model = lambda model_size, device=None: object()
+    timed_captions_generator.transcribe_timestamped = fake_transcribe
+    async_video_search.PEXELS_SEARCH_URL = f"{pexels_url}/videos/search"
+
+def run_jobs(jobs_dir, outputs_dir, num_jobs, concurrency, scheduler, script=None):
+    from utility.jobs.job_queue import JobQueue, JOB_DONE, JOB_FAILED
+    queue = JobQueue(num_workers=concurrency, jobs_dir=jobs_dir, outputs_dir=outputs_dir, scheduler=scheduler)
+    queue.start()
+    try:
+        started = time.perf_counter()
+        job_ids = [queue.submit(BENCHMARK_TOPIC, script=script) for _ in range(num_jobs)]
+        while True:
+            jobs = [queue.get(job_id) for job_id in job_ids]
+            if all(job['status'] in (JOB_DONE, JOB_FAILED) for job in jobs):
+                break
+            time.sleep(0.2)
+        elapsed = time.perf_counter() - started
+    finally:
+        queue.shutdown()
+    return jobs, elapsed
+
+def summarize(jobs, elapsed, concurrency):
+    import resource
+    stages = {}
+    for job in jobs:
+        for timing in job['timings']:
+            stages.setdefault(timing['stage'], []).append(timing)
+
+    done = [job for job in jobs if job['status'] == 'done']
+    http = {}
+    for job in jobs:
+        for timing in job['timings']:
+            for name, count in timing.get('http', {}).items():
+                http[name] = http.get(name, 0) + count
+    peak_rss = max((timing['peak_rss_bytes'] or 0 for job in jobs for timing in job['timings']), default=0)
+    return {
+        'jobs': len(jobs),
+        'succeeded': len(done),
+        'failed': [job['error'] for job in jobs if job['status'] != 'done'],
+        'concurrency': concurrency,
+        'elapsed_seconds': elapsed,
+        'jobs_per_minute': len(done) / elapsed * 60 if elapsed else 0.0,
+        'peak_worker_rss_bytes': peak_rss,
+        'http': http,
+        # Largest single waited-for child process, including ffmpeg encoders
+        'peak_child_rss_bytes': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024,
+        'stages': {
+            stage: {
+                'count': len(timings),
+                'wall_mean': sum(t['wall_seconds'] for t in timings) / len(timings),
+                'wall_p50': percentile([t['wall_seconds'] for t in timings], 0.5),
+                'wall_p95': percentile([t['wall_seconds'] for t in timings], 0.95),
+                'wall_max': max(t['wall_seconds'] for t in timings),
+                'cpu_mean': sum(t['cpu_seconds'] for t in timings) / len(timings),
+                'cpu_scope': timings[0].get('cpu_scope', 'process'),
+            }
+            for stage, timings in stages.items()
+        }
+    }
+
+def print_report(summary):
+    print(f"\nJobs: {summary['succeeded']}/{summary['jobs']} succeeded at concurrency {summary['concurrency']}")
+    for error in summary['failed']:
+        print(f"  failed: {error}")
+    print(f"Elapsed: {summary['elapsed_seconds']:.1f}s  Throughput: {summary['jobs_per_minute']:.2f} jobs/min")
+    print(f"Peak worker RSS: {summary['peak_worker_rss_bytes'] / 2**20:.0f} MB  "
+          f"Peak child RSS: {summary['peak_child_rss_bytes'] / 2**20:.0f} MB")
+    http = summary['http']
+    print(f"HTTP: {http.get('requests', 0)} requests, {http.get('new_connections', 0)} new connections, "
+          f"{http.get('reused_connections', 0)} reused, {http.get('retries', 0)} retries\n")
+    print(f"{'stage':<16}{'count':>6}{'mean s':>10}{'p50 s':>10}{'p95 s':>10}{'max s':>10}{'cpu s':>10}  cpu scope")
+    for stage, stats in summary['stages'].items():
+        print(f"{stage:<16}{stats['count']:>6}{stats['wall_mean']:>10.2f}{stats['wall_p50']:>10.2f}"
+              f"{stats['wall_p95']:>10.2f}{stats['wall_max']:>10.2f}{stats['cpu_mean']:>10.2f}  {stats['cpu_scope']}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--jobs', type=int, default=4, help="number of jobs to run")
+    parser.add_argument('--concurrency', type=int, default=2, help="number of render worker processes")
+    parser.add_argument('--scheduler', choices=['workers', 'stages'], default='workers',
+                        help="run whole jobs per worker, or overlap jobs stage by stage (STAGE_LIMITS sets the limits)")
+    parser.add_argument('--keep-caches', action='store_true',
+                        help="reuse the configured caches, media store and artifact store instead of starting cold")
+    parser.add_argument('--edit-rerun', action='store_true',
+                        help="then render once more with the script's last line edited, reusing stored artifacts")
+    parser.add_argument('--json', help="also write the summary to this file")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="pipeline_benchmark_")
+    # Configuration is read when the utility modules are imported, so set it first
+    os.environ.setdefault('GROQ_API_KEY', 'benchmark')
+    os.environ.setdefault('OPENAI_KEY', 'benchmark')
+    os.environ.setdefault('PEXELS_KEY', 'benchmark')
+    os.environ['PEXELS_REQUESTS_PER_HOUR'] = '1000000'
+    os.environ['PEXELS_BURST'] = '1000'
+    if not args.keep_caches:
+        os.environ['SEARCH_CACHE_PATH'] = os.path.join(work_dir, 'search_cache.sqlite3')
+        os.environ['SCRIPT_CACHE_PATH'] = os.path.join(work_dir, 'script_cache.sqlite3')
+        os.environ['MEDIA_STORE_DIR'] = os.path.join(work_dir, 'media')
+        os.environ['ARTIFACT_CACHE_PATH'] = os.path.join(work_dir, 'artifacts.sqlite3')
+        os.environ['ARTIFACT_STORE_DIR'] = os.path.join(work_dir, 'artifacts')
+
+    try:
+        clips_dir = os.path.join(work_dir, 'clips')
+        generate_sample_clips(clips_dir, SAMPLE_CLIPS, SAMPLE_CLIP_SECONDS)
+        server, pexels_url = start_fake_pexels(clips_dir)
+        install_fakes(pexels_url)
+
+        jobs, elapsed = run_jobs(os.path.join(work_dir, 'jobs'), os.path.join(work_dir, 'outputs'), args.jobs,
+                                args.concurrency, args.scheduler)
+        summary = summarize(jobs, elapsed, args.concurrency)
+        print_report(summary)
+
+        if args.edit_rerun:
+            # Only the stages and segments downstream of the edited line should be recomputed
+            from utility.script.script_generator import get_fallback_script
+            lines = get_fallback_script(BENCHMARK_TOPIC).splitlines()
+            lines[-1] = lines[-1].rstrip('.') + ", as astronomers keep finding."
+            jobs, elapsed = run_jobs(os.path.join(work_dir, 'jobs'), os.path.join(work_dir, 'outputs'), 1,
+                                     1, args.scheduler, script='\n'.join(lines))
+            summary['edit_rerun'] = summarize(jobs, elapsed, 1)
+            print("\nAfter editing the script's last line:")
+            print_report(summary['edit_rerun'])
+        server.shutdown()
+        write_json(args.json, summary)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Peak memory of the frame-by-frame renderers against segment count.
+
+Renders overlapping segments (so the concat renderer does not apply) with
+the 'composite' renderer, which opens every clip up front, and the 'stream'
+renderer, which opens one segment at a time. Each render runs in its own
+process and reports that process's peak RSS, plus the most file descriptors
+and ffmpeg child processes seen open at once. Example:
+
+    python benchmarks/render_memory_benchmark.py --segments 10,30,60
+"""
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import multiprocessing
+from benchmark_common import generate_sample_clips, generate_audio, local_segments, timed_render, write_json
+
+SAMPLE_CLIPS = 4
+SEGMENT_SECONDS = 1.0
+OVERLAP_SECONDS = 0.1  # Keeps segments overlapping so the concat renderer is skipped
+
+def generate_inputs(work_dir, max_segments):
+    clips = generate_sample_clips(work_dir, SAMPLE_CLIPS, 3, size="1280x720")
+    audio_path = generate_audio(os.path.join(work_dir, "audio.mp3"), max_segments * SEGMENT_SECONDS)
+    return clips, audio_path
+
+def open_handles():
+    """(open file descriptors, live child processes) of this process."""
+    fds = len(os.listdir('/proc/self/fd'))
+    children = 0
+    for task in os.listdir('/proc/self/task'):
+        try:
+            with open(f'/proc/self/task/{task}/children') as f:
+                children += len(f.read().split())
+        except OSError:
+            pass
+    return fds, children
+
+def peak_rss_bytes():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) * 1024
+    return 0
+
+def render_once(renderer, num_segments, clips, audio_path, width, height, result_queue):
+    segments, paths = local_segments(clips, num_segments, SEGMENT_SECONDS, OVERLAP_SECONDS)
+
+    peak = {'fds': 0, 'children': 0}
+    done = threading.Event()
+
+    def sample():
+        while not done.is_set():
+            fds, children = open_handles()
+            peak['fds'] = max(peak['fds'], fds)
+            peak['children'] = max(peak['children'], children)
+            time.sleep(0.05)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    output_path = os.path.join(os.path.dirname(audio_path), f"{renderer}_{num_segments}.mp4")
+    render = timed_render(segments, paths, audio_path, output_path, width=width, height=height, renderer=renderer)
+    done.set()
+    sampler.join()
+    result_queue.put({
+        'renderer': renderer,
+        'segments': num_segments,
+        'ok': render['ok'],
+        'seconds': render['seconds'],
+        'peak_rss_bytes': peak_rss_bytes(),
+        'peak_open_fds': peak['fds'],
+        'peak_child_processes': peak['children'],
+    })
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--segments', default="10,30,60", help="comma-separated segment counts")
+    parser.add_argument('--renderers', default="composite,stream", help="comma-separated renderers")
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=360)
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args()
+
+    counts = [int(count) for count in args.segments.split(',')]
+    renderers = [renderer.strip() for renderer in args.renderers.split(',')]
+    work_dir = tempfile.mkdtemp(prefix="render_memory_benchmark_")
+    results = []
+    try:
+        clips, audio_path = generate_inputs(work_dir, max(counts))
+        for num_segments in counts:
+            for renderer in renderers:
+                # A fresh process per render, so peak RSS is not inherited from earlier runs
+                result_queue = multiprocessing.Queue()
+                process = multiprocessing.Process(target=render_once, args=(
+                    renderer, num_segments, clips, audio_path, args.width, args.height, result_queue))
+                process.start()
+                result = result_queue.get()
+                process.join()
+                results.append(result)
+                print(f"{renderer:<10}{num_segments:>6} segments  {result['seconds']:7.1f}s  "
+                      f"peak RSS {result['peak_rss_bytes'] / 2**20:7.0f} MB  "
+                      f"fds {result['peak_open_fds']:>5}  ffmpeg processes {result['peak_child_processes']:>4}"
+                      f"{'' if result['ok'] else '  FAILED'}", flush=True)
+        write_json(args.json, results)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
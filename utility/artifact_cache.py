@@ -0,0 +1,33 @@
+import os
+import json
+import hashlib
+from utility.disk_cache import DiskCache
+from utility.video.media_store import MediaStore
+
+# Stage outputs keyed by a content hash of their inputs, so re-running a job
+# after a small edit only recomputes what the edit changed
+ARTIFACT_CACHE_PATH = os.getenv('ARTIFACT_CACHE_PATH', '.cache/artifacts.sqlite3')
+ARTIFACT_CACHE_TTL = int(os.getenv('ARTIFACT_CACHE_TTL', 24 * 60 * 60))  # seconds; segment URLs come from searches
+ARTIFACT_CACHE_MAX_ENTRIES = int(os.getenv('ARTIFACT_CACHE_MAX_ENTRIES', 50000))
+ARTIFACT_STORE_DIR = os.getenv('ARTIFACT_STORE_DIR', '.cache/artifacts')
+ARTIFACT_STORE_QUOTA_MB = int(os.getenv('ARTIFACT_STORE_QUOTA_MB', 2048))
+# Bump to invalidate every artifact after a change to how one is produced
+ARTIFACT_VERSION = 1
+
+# JSON artifacts: stage outputs, TTS word timings, transcripts
+artifact_cache = DiskCache(ARTIFACT_CACHE_PATH, ttl=ARTIFACT_CACHE_TTL, max_entries=ARTIFACT_CACHE_MAX_ENTRIES)
+# File artifacts: TTS chunks and normalized segments
+artifact_store = MediaStore(ARTIFACT_STORE_DIR, ARTIFACT_STORE_QUOTA_MB * 1024 * 1024, label="artifact")
+
+def artifact_key(kind, *inputs):
+    """Content address for an artifact: hash of its kind and everything it is computed from."""
+    payload = json.dumps([kind, ARTIFACT_VERSION, inputs], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def file_digest(path):
+    """SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
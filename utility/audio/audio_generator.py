@@ -1,14 +1,146 @@
+import os
+import re
+import shutil
 import edge_tts
 import asyncio
+import threading
+from utility.artifact_cache import artifact_cache, artifact_store, artifact_key
 
-def generate_audio(text):
-    output_filename = "audio_tts.wav"
-    
-    async def _generate():
-        communicate = edge_tts.Communicate(text, "en-AU-WilliamNeural")
-        await communicate.save(output_filename)
-    
-    # Run the async function in a new event loop
-    asyncio.run(_generate())
-    
-    return output_filename
+TTS_VOICE = "en-AU-WilliamNeural"
+# edge-tts always returns 24 kHz, 48 kbit/s mono MP3 at a constant bit rate,
+# so a chunk's duration follows from its size
+TTS_BITRATE = 48000
+TTS_MAX_CONCURRENCY = int(os.getenv('TTS_MAX_CONCURRENCY', 4))
+# Word boundary offsets and durations are in 100 ns ticks
+TICKS_PER_SECOND = 10_000_000
+
+def split_script(text):
+    """Split a script into bullet points and sentences for chunked synthesis."""
+    chunks = []
+    for line in text.splitlines():
+        for sentence in re.split(r'(?<=[.!?])\s+', line.strip()):
+            if re.search(r'\w', sentence):
+                chunks.append(sentence)
+    return chunks
+
+def mp3_duration(path):
+    return os.path.getsize(path) * 8 / TTS_BITRATE
+
+class AudioStream:
+    """Synthesizes a script chunk by chunk in the background.
+
+    Chunks are synthesized concurrently, but iterating the stream yields them in
+    script order as soon as each one is ready, as dicts with the chunk's text,
+    path, offset and duration in seconds, and the timings edge-tts reported for
+    each spoken word. Iterating again replays the chunks already produced.
+    """
+
+    def __init__(self, text, output_dir, prefix="audio_tts", max_concurrency=TTS_MAX_CONCURRENCY):
+        self.texts = split_script(text) or [text]
+        self.output_dir = output_dir
+        self.prefix = prefix
+        self.max_concurrency = max_concurrency
+        self.chunks = []
+        self.error = None
+        self.done = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        try:
+            asyncio.run(self._produce())
+        except Exception as e:
+            with self.condition:
+                self.error = e
+        finally:
+            with self.condition:
+                self.done = True
+                self.condition.notify_all()
+
+    def _communicate(self, text):
+        try:
+            # edge-tts 7 reports sentence boundaries unless word boundaries are requested
+            return edge_tts.Communicate(text, TTS_VOICE, boundary="WordBoundary")
+        except TypeError:
+            return edge_tts.Communicate(text, TTS_VOICE)
+
+    async def _synthesize(self, index, semaphore):
+        """Write one chunk's audio and return (path, word timings in seconds within the chunk)."""
+        path = os.path.join(self.output_dir, f"{self.prefix}_chunk_{index:03d}.mp3")
+        # A chunk's audio depends only on its text and the voice, so unchanged chunks are reused
+        key = artifact_key('tts', TTS_VOICE, self.texts[index])
+        words = artifact_cache.get(key)
+        stored_path = artifact_store.lookup(key, '.mp3') if words is not None else None
+        if stored_path:
+            shutil.copyfile(stored_path, path)
+            return path, words
+
+        words = []
+        async with semaphore:
+            communicate = self._communicate(self.texts[index])
+            with open(path, "wb") as f:
+                async for message in communicate.stream():
+                    if message["type"] == "audio":
+                        f.write(message["data"])
+                    elif message["type"] == "WordBoundary":
+                        start = message["offset"] / TICKS_PER_SECOND
+                        end = start + message["duration"] / TICKS_PER_SECOND
+                        words.append({'text': message["text"], 'start': start, 'end': end})
+        try:
+            artifact_store.put(key, path, '.mp3')
+            artifact_cache.set(key, words)
+        except Exception as e:
+            print(f"Error caching audio chunk: {str(e)}")
+        return path, words
+
+    async def _produce(self):
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        tasks = [asyncio.create_task(self._synthesize(i, semaphore)) for i in range(len(self.texts))]
+        offset = 0.0
+        try:
+            for index, task in enumerate(tasks):
+                path, words = await task
+                chunk = {
+                    'index': index,
+                    'text': self.texts[index],
+                    'path': path,
+                    'offset': offset,
+                    'duration': mp3_duration(path),
+                    'words': words
+                }
+                offset += chunk['duration']
+                with self.condition:
+                    self.chunks.append(chunk)
+                    self.condition.notify_all()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def __iter__(self):
+        index = 0
+        while True:
+            with self.condition:
+                while index >= len(self.chunks) and not self.done:
+                    self.condition.wait()
+                if index < len(self.chunks):
+                    chunk = self.chunks[index]
+                elif self.error:
+                    raise self.error
+                else:
+                    return
+            yield chunk
+            index += 1
+
+    def save(self, output_filename):
+        """Wait for every chunk and join them into one MP3 file."""
+        with open(output_filename, "wb") as output:
+            for chunk in self:
+                with open(chunk['path'], "rb") as f:
+                    output.write(f.read())
+        return output_filename
+
+def generate_audio(text, output_filename="audio_tts.wav"):
+    output_dir = os.path.dirname(os.path.abspath(output_filename))
+    prefix = os.path.splitext(os.path.basename(output_filename))[0]
+    return AudioStream(text, output_dir, prefix).save(output_filename)
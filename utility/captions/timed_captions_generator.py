@@ -14,54 +14,154 @@ if module_path not in sys.path:
 import whisper_timestamped as whisper
 from whisper_timestamped import load_model, transcribe_timestamped
 import re
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from utility.artifact_cache import artifact_cache, artifact_key, file_digest
+
+# "tts" times captions from the word boundaries edge-tts reports while synthesizing;
+# "whisper" always transcribes. Audio without boundaries is transcribed either way.
+CAPTION_MODE = os.getenv('CAPTION_MODE', 'tts')
+
+# Whisper model registry: each (model size, device) is loaded once per process
+WHISPER_MODEL_CACHE_SIZE = int(os.getenv('WHISPER_MODEL_CACHE_SIZE', 2))
+WHISPER_WARMUP_MODELS = os.getenv('WHISPER_WARMUP_MODELS', 'base' if CAPTION_MODE == 'whisper' else '')
+WHISPER_DEVICE = os.getenv('WHISPER_DEVICE') or None
+
+_whisper_models = OrderedDict()
+_whisper_models_lock = threading.Lock()
+# whisper_timestamped hooks into the model for each call, so one model is
+# never used by two threads at once
+_whisper_transcribe_lock = threading.Lock()
+
+def get_whisper_model(model_size="base", device=WHISPER_DEVICE):
+    """Return a cached Whisper model, loading it on first use and evicting the least recently used size."""
+    key = (model_size, device)
+    with _whisper_models_lock:
+        model = _whisper_models.get(key)
+        if model is not None:
+            _whisper_models.move_to_end(key)
+            return model
+
+        model = load_model(model_size, device=device)
+        _whisper_models[key] = model
+        while len(_whisper_models) > max(1, WHISPER_MODEL_CACHE_SIZE):
+            evicted_key, _ = _whisper_models.popitem(last=False)
+            print(f"Evicted Whisper model {evicted_key[0]} ({evicted_key[1] or 'default device'})")
+        return model
+
+def warm_up_whisper_models(model_sizes=None, device=WHISPER_DEVICE):
+    """Load the configured model sizes up front so the first job does not pay for it."""
+    if model_sizes is None:
+        model_sizes = [size.strip() for size in WHISPER_WARMUP_MODELS.split(',') if size.strip()]
+    for model_size in model_sizes:
+        get_whisper_model(model_size, device)
+
+# Render workers attached to a TranscriptionService set this to send their audio there
+_transcriber = None
+
+def set_transcriber(transcriber):
+    """Route transcription through transcriber(audio_path, model_size) instead of a model in this process."""
+    global _transcriber
+    _transcriber = transcriber
+
+def transcribe_audio(audio_filename, model_size="base"):
+    if _transcriber is not None:
+        return _transcriber(audio_filename, model_size)
+    model = get_whisper_model(model_size)
+    with _whisper_transcribe_lock:
+        return transcribe_timestamped(model, audio_filename, verbose=False, fp16=False)
+
+def transcribe_chunk(audio_filename, model_size="base"):
+    """Transcribe one audio chunk, reusing the stored transcript of identical audio."""
+    key = artifact_key('transcript', model_size, file_digest(audio_filename))
+    gen = artifact_cache.get(key)
+    if gen is None:
+        result = transcribe_audio(audio_filename, model_size)
+        # Keep only what captioning reads
+        gen = {
+            'text': result['text'],
+            'segments': [
+                {'words': [{'text': word['text'], 'start': word['start'], 'end': word['end']}
+                           for word in segment['words']]}
+                for segment in result['segments']
+            ]
+        }
+        artifact_cache.set(key, gen)
+    return gen
 
 def generate_timed_captions(audio_filename,model_size="base"):
-    WHISPER_MODEL = load_model(model_size)
    
-    gen = transcribe_timestamped(WHISPER_MODEL, audio_filename, verbose=False, fp16=False)
+    gen = transcribe_audio(audio_filename, model_size)
    
     return getCaptionsWithTime(gen)
 
+def generate_timed_captions_for_chunks(audio_chunks, model_size="base", mode=CAPTION_MODE):
+    """Caption audio that arrives in chunks, handling each chunk as soon as it is available.
+
+    audio_chunks yields dicts with the chunk's 'path' and its 'offset' in seconds
+    within the full audio, such as an AudioStream. In "tts" mode a chunk's
+    'words' timings are used when present; other chunks are transcribed by Whisper.
+    """
+    texts = []
+    segments = []
+    for chunk in audio_chunks:
+        if mode == 'tts' and chunk.get('words'):
+            words = [word for word in chunk['words'] if re.search(r'\w', word['text'])]
+            gen = {'text': ' '.join(word['text'] for word in words), 'segments': [{'words': words}]}
+        else:
+            gen = transcribe_chunk(chunk['path'], model_size)
+        texts.append(gen['text'].strip())
+        for segment in gen['segments']:
+            segments.append({'words': [
+                dict(word, start=round(word['start'] + chunk['offset'], 2), end=round(word['end'] + chunk['offset'], 2))
+                for word in segment['words']
+            ]})
+    return getCaptionsWithTime({'text': ' '.join(texts), 'segments': segments})
+
 def splitWordsBySize(words, maxCaptionSize):
    
     halfCaptionSize = maxCaptionSize / 2
     captions = []
-    while words:
-        caption = words[0]
-        words = words[1:]
-        while words and len(caption + ' ' + words[0]) <= maxCaptionSize:
-            caption += ' ' + words[0]
-            words = words[1:]
-            if len(caption) >= halfCaptionSize and words:
+    i = 0
+    while i < len(words):
+        caption = words[i]
+        i += 1
+        while i < len(words) and len(caption) + 1 + len(words[i]) <= maxCaptionSize:
+            caption += ' ' + words[i]
+            i += 1
+            if len(caption) >= halfCaptionSize and i < len(words):
                 break
         captions.append(caption)
     return captions
 
-def getTimestampMapping(whisper_analysis):
-   
+def getTimestampOffsets(whisper_analysis):
+    """Character offset where each transcribed word ends, in ascending order, and the word's end time."""
     index = 0
-    locationToTimestamp = {}
+    offsets = []
+    times = []
     for segment in whisper_analysis['segments']:
         for word in segment['words']:
-            newIndex = index + len(word['text'])+1
-            locationToTimestamp[(index, newIndex)] = word['end']
-            index = newIndex
-    return locationToTimestamp
+            index += len(word['text']) + 1
+            offsets.append(index)
+            times.append(word['end'])
+    return offsets, times
 
 def cleanWord(word):
    
     return re.sub(r'[^\w\s\-_"\'\']', '', word)
 
-def interpolateTimeFromDict(word_position, d):
-   
-    for key, value in d.items():
-        if key[0] <= word_position <= key[1]:
-            return value
+def interpolateTimeFromOffsets(word_position, offsets, times):
+    """End time of the first word whose span reaches word_position, or None past the last word."""
+    # Word spans are contiguous from offset 0, so the first end offset >= position is the match
+    i = bisect_left(offsets, word_position)
+    if i < len(offsets):
+        return times[i]
     return None
 
 def getCaptionsWithTime(whisper_analysis, maxCaptionSize=15, considerPunctuation=False):
    
-    wordLocationToTime = getTimestampMapping(whisper_analysis)
+    offsets, times = getTimestampOffsets(whisper_analysis)
     position = 0
     start_time = 0
     CaptionsPairs = []
@@ -76,7 +176,7 @@ def getCaptionsWithTime(whisper_analysis, maxCaptionSize=15, considerPunctuation
     
     for word in words:
         position += len(word) + 1
-        end_time = interpolateTimeFromDict(position, wordLocationToTime)
+        end_time = interpolateTimeFromOffsets(position, offsets, times)
         if end_time and word:
             CaptionsPairs.append(((start_time, end_time), word))
             start_time = end_time
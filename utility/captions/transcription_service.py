@@ -0,0 +1,143 @@
+import os
+import time
+import uuid
+import queue
+import logging
+import threading
+import multiprocessing
+
+logger = logging.getLogger(__name__)
+
+# "auto" runs the service when captions are timed by Whisper (CAPTION_MODE=whisper)
+TRANSCRIPTION_SERVICE = os.getenv('TRANSCRIPTION_SERVICE', 'auto')
+# Torch intra-op threads for the service; one process owns the cores instead of
+# every render worker contending for them
+TRANSCRIPTION_THREADS = int(os.getenv('TRANSCRIPTION_THREADS', 0)) or os.cpu_count() or 1
+TRANSCRIPTION_TIMEOUT = int(os.getenv('TRANSCRIPTION_TIMEOUT', 600))
+
+def transcription_service_enabled():
+    if TRANSCRIPTION_SERVICE == 'auto':
+        return os.getenv('CAPTION_MODE', 'tts') == 'whisper'
+    return TRANSCRIPTION_SERVICE.lower() in ('1', 'true', 'yes', 'on')
+
+def _service_main(request_queue, reply_queues, threads):
+    """Service process loop: transcribe requests one at a time until a None sentinel arrives."""
+    import torch
+    import utility.captions.timed_captions_generator as captions
+
+    torch.set_num_threads(threads)
+    try:
+        captions.warm_up_whisper_models()
+    except Exception as e:
+        logger.error(f"Whisper warm-up failed: {str(e)}")
+
+    while True:
+        request = request_queue.get()
+        if request is None:
+            break
+        client_id, request_id, audio_path, model_size = request
+        try:
+            model = captions.get_whisper_model(model_size)
+            result = captions.transcribe_timestamped(model, audio_path, verbose=False, fp16=False)
+            reply = (request_id, result, None)
+        except Exception as e:
+            reply = (request_id, None, str(e))
+        reply_queues[client_id].put(reply)
+
+class TranscriptionClient:
+    """Sends audio to a TranscriptionService and waits for the Whisper result.
+
+    Several threads may share one client: whichever waiting thread is reading
+    the reply queue hands every other waiting thread its reply.
+    """
+
+    def __init__(self, client_id, request_queue, reply_queue):
+        self.client_id = client_id
+        self.request_queue = request_queue
+        self.reply_queue = reply_queue
+        self._init_waiters()
+
+    def _init_waiters(self):
+        self.lock = threading.Lock()
+        self.reply_arrived = threading.Condition(self.lock)
+        self.waiting = set()
+        self.replies = {}
+        self.reading = False
+
+    def __getstate__(self):
+        # Locks cannot be pickled; a spawned worker starts with no waiters anyway
+        return {'client_id': self.client_id, 'request_queue': self.request_queue, 'reply_queue': self.reply_queue}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_waiters()
+
+    def transcribe(self, audio_path, model_size="base"):
+        request_id = uuid.uuid4().hex
+        deadline = time.monotonic() + TRANSCRIPTION_TIMEOUT
+        with self.lock:
+            self.waiting.add(request_id)
+        try:
+            self.request_queue.put((self.client_id, request_id, os.path.abspath(audio_path), model_size))
+            result, error = self._wait_reply(request_id, deadline)
+        finally:
+            with self.lock:
+                self.waiting.discard(request_id)
+                self.replies.pop(request_id, None)
+        if error:
+            raise RuntimeError(f"Transcription failed: {error}")
+        return result
+
+    def _wait_reply(self, request_id, deadline):
+        while True:
+            with self.lock:
+                while request_id not in self.replies and self.reading:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(f"No transcription after {TRANSCRIPTION_TIMEOUT} seconds")
+                    self.reply_arrived.wait(remaining)
+                if request_id in self.replies:
+                    return self.replies.pop(request_id)
+                self.reading = True
+
+            reply = None
+            try:
+                reply = self.reply_queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                raise TimeoutError(f"No transcription after {TRANSCRIPTION_TIMEOUT} seconds")
+            finally:
+                with self.lock:
+                    self.reading = False
+                    # Replies to requests that already timed out are dropped
+                    if reply is not None and reply[0] in self.waiting:
+                        self.replies[reply[0]] = reply[1:]
+                    self.reply_arrived.notify_all()
+
+class TranscriptionService:
+    """One process that holds the Whisper models and transcribes audio for every render worker.
+
+    Requests from all workers share one queue and are served in arrival order,
+    each reply going back on the requesting client's own queue.
+    """
+
+    def __init__(self, num_clients, threads=TRANSCRIPTION_THREADS):
+        self.threads = threads
+        self.request_queue = multiprocessing.Queue()
+        self.reply_queues = [multiprocessing.Queue() for _ in range(num_clients)]
+        self.process = None
+
+    def start(self):
+        self.process = multiprocessing.Process(
+            target=_service_main, args=(self.request_queue, self.reply_queues, self.threads), daemon=True
+        )
+        self.process.start()
+        logger.info(f"Started transcription service with {self.threads} threads")
+
+    def client(self, client_id):
+        return TranscriptionClient(client_id, self.request_queue, self.reply_queues[client_id])
+
+    def shutdown(self):
+        if self.process:
+            self.request_queue.put(None)
+            self.process.join(timeout=5)
+            self.process = None
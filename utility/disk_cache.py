@@ -0,0 +1,155 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: concurrent misses are computed twice instead
+    fcntl = None
+
+LOCK_STRIPES = 256
+
+class DiskCache:
+    """Persistent JSON key-value cache in SQLite with a TTL, an LRU size bound and hit/miss counters.
+
+    The database can be shared by every worker process on the box.
+    """
+
+    def __init__(self, path, ttl=None, max_entries=None):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.conn = None
+        self.pid = None
+
+    def _connect(self):
+        # SQLite connections must not cross a fork, so reconnect in each process
+        if self.conn is None or self.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT, created_at REAL, accessed_at REAL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS token_buckets (name TEXT PRIMARY KEY, tokens REAL, updated_at REAL)")
+            self.pid = os.getpid()
+        return self.conn
+
+    def _count(self, conn, name):
+        conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1) ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,)
+        )
+
+    def _is_expired(self, created_at, now):
+        return self.ttl is not None and now - created_at > self.ttl
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss or an expired entry."""
+        now = time.time()
+        with self.lock:
+            conn = self._connect()
+            row = conn.execute("SELECT value, created_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None or self._is_expired(row[1], now):
+                if row is not None:
+                    conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._count(conn, "misses")
+                return None
+            conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+            self._count(conn, "hits")
+            return json.loads(row[0])
+
+    def set(self, key, value):
+        now = time.time()
+        with self.lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now)
+            )
+            if self.ttl is not None:
+                conn.execute("DELETE FROM entries WHERE created_at < ?", (now - self.ttl,))
+            if self.max_entries is not None:
+                # Evict the least recently used entries beyond the size bound
+                conn.execute(
+                    "DELETE FROM entries WHERE key IN "
+                    "(SELECT key FROM entries ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+
+    def reserve_token(self, name, rate, capacity):
+        """Take a token from the named token bucket and return how many seconds to wait before using it.
+
+        The bucket lives in the database, so every process sharing it draws
+        from one budget of rate tokens per second.
+        """
+        with self.lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = conn.execute("SELECT tokens, updated_at FROM token_buckets WHERE name = ?", (name,)).fetchone()
+                tokens = capacity if row is None else min(capacity, row[0] + max(0.0, now - row[1]) * rate)
+                tokens -= 1
+                conn.execute("INSERT OR REPLACE INTO token_buckets (name, tokens, updated_at) VALUES (?, ?, ?)",
+                             (name, tokens, now))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        if tokens >= 0:
+            return 0
+        return -tokens / rate
+
+    def lock_key(self, key):
+        """Block until this process holds key's cross-process lock and return a handle for unlock_key().
+
+        Lets one worker compute a missing value while the others wait and then
+        read it from the cache.
+        """
+        if fcntl is None:
+            return None
+        lock_dir = self.path + '.locks'
+        os.makedirs(lock_dir, exist_ok=True)
+        # Keys share a fixed set of lock files so the directory does not grow with the cache
+        stripe = int(hashlib.sha256(key.encode('utf-8')).hexdigest(), 16) % LOCK_STRIPES
+        lock_file = open(os.path.join(lock_dir, f"{stripe:03d}.lock"), 'w')
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return lock_file
+
+    def unlock_key(self, handle):
+        if handle is not None:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+            handle.close()
+
+    def keys(self):
+        """Return every unexpired key, without reading the values."""
+        with self.lock:
+            rows = self._connect().execute("SELECT key FROM entries WHERE ? IS NULL OR created_at >= ?",
+                                           (self.ttl, time.time() - (self.ttl or 0))).fetchall()
+        return [row[0] for row in rows]
+
+    def stats(self):
+        with self.lock:
+            conn = self._connect()
+            counters = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+            entries = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return {
+            "hits": counters.get("hits", 0),
+            "misses": counters.get("misses", 0),
+            "entries": entries
+        }
+
+    def clear(self):
+        with self.lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM entries")
+            conn.execute("DELETE FROM counters")
@@ -0,0 +1,189 @@
+import os
+import time
+import random
+import threading
+import contextvars
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 5))  # seconds
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', 30))  # seconds between bytes, not for the whole body
+HTTP_POOL_HOSTS = int(os.getenv('HTTP_POOL_HOSTS', 10))  # Hosts that keep a connection pool
+HTTP_POOL_PER_HOST = int(os.getenv('HTTP_POOL_PER_HOST', 8))  # Kept-alive connections per host
+HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', 3))
+HTTP_BACKOFF_BASE = 0.5  # seconds; doubled for each retry
+HTTP_BACKOFF_MAX = 30.0  # seconds; also caps Retry-After
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+
+# Counters for the work being measured in this context, see count_requests()
+_context_counts = contextvars.ContextVar('http_context_counts', default=None)
+
+def _with_reused(counts):
+    counts = dict(counts)
+    # Every request not made on a freshly opened connection reused a kept-alive one
+    counts['reused_connections'] = max(0, counts['requests'] - counts['new_connections'])
+    return counts
+
+class ConnectionStats:
+    """Process-wide counters of outbound requests, new connections and retries."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {'requests': 0, 'new_connections': 0, 'retries': 0}
+
+    def count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+            counts = _context_counts.get()
+            if counts is not None:
+                counts[name] += 1
+
+    def add(self, counts):
+        """Credit counts made in another context (e.g. on a download thread) to this context's counters."""
+        with self.lock:
+            context_counts = _context_counts.get()
+            if context_counts is not None:
+                for name in context_counts:
+                    context_counts[name] += counts.get(name, 0)
+
+    def snapshot(self, counts=None):
+        """The process-wide counters, or those of a count_requests() block when given its dict."""
+        with self.lock:
+            return _with_reused(self.counts if counts is None else counts)
+
+connection_stats = ConnectionStats()
+
+@contextmanager
+def count_requests(counts=None):
+    """Count the outbound HTTP made in this context into counts, a fresh dict unless one is given.
+
+    Threads started inside the block only count into it if they run in a copy
+    of this context; read the dict with connection_stats.snapshot(counts).
+    """
+    if counts is None:
+        counts = {'requests': 0, 'new_connections': 0, 'retries': 0}
+    token = _context_counts.set(counts)
+    try:
+        yield counts
+    finally:
+        _context_counts.reset(token)
+
+class _CountingHTTPConnection(HTTPConnection):
+    def connect(self):
+        connection_stats.count('new_connections')
+        return super().connect()
+
+class _CountingHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        connection_stats.count('new_connections')
+        return super().connect()
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _CountingHTTPConnection
+
+    def urlopen(self, *args, **kwargs):
+        connection_stats.count('requests')
+        return super().urlopen(*args, **kwargs)
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _CountingHTTPSConnection
+
+    def urlopen(self, *args, **kwargs):
+        connection_stats.count('requests')
+        return super().urlopen(*args, **kwargs)
+
+class _CountingAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _CountingHTTPConnectionPool,
+            'https': _CountingHTTPSConnectionPool,
+        }
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """The process's shared keep-alive session; connections must not cross a fork, so each process has its own."""
+    global _session, _session_pid
+    with _session_lock:
+        if _session is None or _session_pid != os.getpid():
+            session = requests.Session()
+            adapter = _CountingAdapter(pool_connections=HTTP_POOL_HOSTS, pool_maxsize=HTTP_POOL_PER_HOST,
+                                       pool_block=True)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers['User-Agent'] = USER_AGENT
+            _session, _session_pid = session, os.getpid()
+        return _session
+
+def backoff_delay(attempt):
+    """Exponential backoff with full jitter for the given zero-based retry attempt."""
+    return random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * 2 ** attempt))
+
+def retry_after_delay(headers):
+    """Seconds asked for by a Retry-After header (delay or HTTP date), or None."""
+    value = headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        delay = float(value)
+    except ValueError:
+        try:
+            delay = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(HTTP_BACKOFF_MAX, max(0.0, delay))
+
+def http_request(method, url, retries=HTTP_MAX_RETRIES, **kwargs):
+    """Send a request on the shared session, retrying connection errors, timeouts, 429 and 5xx.
+
+    Waits as long as Retry-After asks when the server sends it, otherwise backs
+    off with jitter. Once retries run out the last response is returned, so
+    callers still check its status, or the last error is raised.
+    """
+    kwargs.setdefault('timeout', (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+    session = get_session()
+    for attempt in range(retries + 1):
+        try:
+            response = session.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == retries:
+                raise
+            delay = backoff_delay(attempt)
+            print(f"Request to {url} failed: {str(e)}. Retrying in {delay:.1f} seconds...")
+        else:
+            if response.status_code not in RETRY_STATUSES or attempt == retries:
+                return response
+            delay = retry_after_delay(response.headers)
+            if delay is None:
+                delay = backoff_delay(attempt)
+            response.close()
+            print(f"Request to {url} returned {response.status_code}. Retrying in {delay:.1f} seconds...")
+        connection_stats.count('retries')
+        time.sleep(delay)
+
+def http_get(url, **kwargs):
+    return http_request('GET', url, **kwargs)
+
+def aiohttp_trace_config():
+    """aiohttp TraceConfig that adds an aiohttp session's requests and connections to connection_stats."""
+    import aiohttp
+
+    async def on_request_start(session, context, params):
+        connection_stats.count('requests')
+
+    async def on_connection_create_end(session, context, params):
+        connection_stats.count('new_connections')
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+    return trace_config
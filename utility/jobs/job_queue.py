@@ -0,0 +1,407 @@
+import os
+import glob
+import time
+import uuid
+import queue
+import shutil
+import logging
+import threading
+import multiprocessing
+from collections import OrderedDict
+from utility.metrics import pipeline_metrics
+from utility.utils import response_log
+from utility.captions.transcription_service import TranscriptionService, transcription_service_enabled
+from utility.video.render_profiles import parse_render_profiles
+from utility.video.encoder_profiles import parse_encoder_profile, set_render_concurrency
+
+logger = logging.getLogger(__name__)
+
+# Job states
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+MAX_FINISHED_JOBS = 1000  # Finished jobs kept for status lookups; older ones are deleted with their files
+# Seconds a finished job and its files are kept; 0 keeps them until MAX_FINISHED_JOBS is reached
+JOB_RETENTION_SECONDS = int(os.getenv('JOB_RETENTION_SECONDS', 0))
+WORKER_CHECK_INTERVAL = 5.0  # seconds between checks that the worker processes are alive
+MAX_BATCHES = 100  # Most recent batches kept in memory for status lookups
+# 'workers' runs each job start to finish in one of num_workers processes;
+# 'stages' sends every job through one stage scheduler with per-stage limits
+JOB_SCHEDULER = os.getenv('JOB_SCHEDULER', 'workers')
+
+def publish_output(path, output_path):
+    """Move a rendered file to its published path, so readers only ever see a complete file."""
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    try:
+        os.replace(path, output_path)
+    except OSError:
+        # Different filesystem: copy next to the target, then rename into place
+        temp_path = output_path + '.part'
+        shutil.copyfile(path, temp_path)
+        os.replace(temp_path, output_path)
+        os.unlink(path)
+    return output_path
+
+def _prepare_worker(transcription_client):
+    from utility.captions.timed_captions_generator import warm_up_whisper_models, set_transcriber
+
+    if transcription_client is not None:
+        # The transcription service holds the model; no need to load one here
+        set_transcriber(transcription_client.transcribe)
+    else:
+        try:
+            warm_up_whisper_models()
+        except Exception as e:
+            logger.error(f"Whisper warm-up failed: {str(e)}")
+
+def _job_done_event(output_prefix, rendered):
+    outputs = {profile: publish_output(path, f"{output_prefix}_{profile}.mp4") for profile, path in rendered.items()}
+    return {
+        'status': JOB_DONE,
+        # The first requested profile is the job's default video
+        'output_path': next(iter(outputs.values())),
+        'outputs': outputs,
+        'finished_at': time.time()
+    }
+
+def _job_failed_event(error):
+    return {'status': JOB_FAILED, 'error': str(error), 'finished_at': time.time()}
+
+def _expired_job(job_id):
+    """Stand-in snapshot for a job no longer held in memory."""
+    return dict(_job_failed_event("Job record expired before it was reported"), job_id=job_id, topic=None, stage=None,
+                batch_id=None, profiles=[], encoder_profile=None, output_path=None, outputs={}, created_at=None,
+                started_at=None, worker_pid=None, timings=[])
+
+def _worker_main(task_queue, event_queue, transcription_client=None, num_workers=1):
+    """Worker process loop: take jobs off the task queue until a None sentinel arrives."""
+    # Imported here so the web process does not pay for the pipeline imports
+    from utility.pipeline import run_pipeline
+
+    _prepare_worker(transcription_client)
+    # Every worker may be encoding at once, so each gets its share of the CPUs
+    set_render_concurrency(num_workers)
+
+    try:
+        while True:
+            task = task_queue.get()
+            if task is None:
+                break
+            job_id, topic, job_dir, output_prefix, profiles, script, encoder_profile = task
+            event_queue.put((job_id, {'status': JOB_RUNNING, 'started_at': time.time(), 'worker_pid': os.getpid()}))
+            try:
+                rendered = run_pipeline(
+                    topic, job_dir,
+                    on_stage=lambda stage: event_queue.put((job_id, {'stage': stage})),
+                    on_timing=lambda timing: event_queue.put((job_id, {'timing': timing})),
+                    profiles=profiles,
+                    script=script,
+                    encoder_profile=encoder_profile
+                )
+                event_queue.put((job_id, _job_done_event(output_prefix, rendered)))
+            except Exception as e:
+                event_queue.put((job_id, _job_failed_event(e)))
+    finally:
+        # Write out the response log before the process exits
+        response_log.close()
+
+def _scheduler_main(task_queue, event_queue, transcription_client=None):
+    """Stage scheduler process loop: every job flows through one StageScheduler, overlapping with the others."""
+    from utility.pipeline import start_job
+    from utility.jobs.stage_scheduler import StageScheduler
+    from utility.metrics import measure_per_thread
+
+    _prepare_worker(transcription_client)
+    # Stages of different jobs share this process, so each is measured on its own thread
+    measure_per_thread()
+    # Stage load events carry no job ID
+    scheduler = StageScheduler(on_load=lambda load: event_queue.put((None, {'stage_load': load})))
+
+    def submit(job_id, topic, job_dir, output_prefix, profiles, script, encoder_profile):
+        def on_done(job, error):
+            if error is None:
+                try:
+                    update = _job_done_event(output_prefix, job['outputs'])
+                except Exception as e:
+                    update = _job_failed_event(e)
+            else:
+                update = _job_failed_event(error)
+            event_queue.put((job_id, update))
+
+        event_queue.put((job_id, {'status': JOB_RUNNING, 'started_at': time.time(), 'worker_pid': os.getpid()}))
+        try:
+            job = start_job(topic, job_dir, profiles, script, encoder_profile)
+        except Exception as e:
+            event_queue.put((job_id, _job_failed_event(e)))
+            return
+        scheduler.submit(
+            job,
+            on_stage=lambda stage: event_queue.put((job_id, {'stage': stage})),
+            on_timing=lambda timing: event_queue.put((job_id, {'timing': timing})),
+            on_done=on_done
+        )
+
+    try:
+        while True:
+            task = task_queue.get()
+            if task is None:
+                break
+            submit(*task)
+        scheduler.shutdown()
+    finally:
+        response_log.close()
+
+class JobQueue:
+    """Local job queue drained by a pool of render worker processes."""
+
+    def __init__(self, num_workers=2, jobs_dir="jobs", outputs_dir="outputs", scheduler=JOB_SCHEDULER):
+        self.scheduler = scheduler
+        # The stage scheduler is a single process that sizes its own pools
+        self.num_workers = 1 if scheduler == 'stages' else max(1, int(num_workers))
+        self.jobs_dir = jobs_dir
+        # Finished videos are published here as <job_id>_<render profile>.mp4
+        self.outputs_dir = outputs_dir
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+        self.job_finished = threading.Condition(self.lock)
+        self.batches = OrderedDict()
+        self.task_queue = multiprocessing.Queue()
+        self.event_queue = multiprocessing.Queue()
+        self.workers = []
+        self.collector = None
+        self.transcription_service = None
+        self.stage_load = {}
+        self.stopping = False
+
+    def start(self):
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        os.makedirs(self.outputs_dir, exist_ok=True)
+        if transcription_service_enabled():
+            self.transcription_service = TranscriptionService(num_clients=self.num_workers)
+            self.transcription_service.start()
+        for i in range(self.num_workers):
+            self.workers.append(self._start_worker(i))
+        self.collector = threading.Thread(target=self._collect_events, daemon=True)
+        self.collector.start()
+        if self.scheduler == 'stages':
+            logger.info("Started the stage scheduler")
+        else:
+            logger.info(f"Started {self.num_workers} render workers")
+
+    def _start_worker(self, index):
+        client = self.transcription_service.client(index) if self.transcription_service else None
+        if self.scheduler == 'stages':
+            # Not a daemon: daemonic processes cannot start the render pool
+            worker = multiprocessing.Process(target=_scheduler_main, args=(self.task_queue, self.event_queue, client))
+        else:
+            worker = multiprocessing.Process(target=_worker_main,
+                                             args=(self.task_queue, self.event_queue, client, self.num_workers),
+                                             daemon=True)
+        worker.start()
+        return worker
+
+    def submit(self, topic, batch_id=None, profiles=None, script=None, encoder_profile=None):
+        """Queue a topic for rendering in the given render profiles and return the new job ID.
+
+        script replaces the generated script; stages whose inputs the edit did
+        not change reuse their stored outputs. encoder_profile picks the
+        encoder settings (default ENCODER_PROFILE).
+        """
+        profiles = parse_render_profiles(profiles)
+        encoder_profile = parse_encoder_profile(encoder_profile)
+        job_id = uuid.uuid4().hex
+        job_dir = os.path.abspath(os.path.join(self.jobs_dir, job_id))
+        output_prefix = os.path.abspath(os.path.join(self.outputs_dir, job_id))
+        with self.lock:
+            self.jobs[job_id] = {
+                'job_id': job_id,
+                'topic': topic,
+                'status': JOB_QUEUED,
+                'stage': None,
+                'job_dir': job_dir,
+                'batch_id': batch_id,
+                'profiles': profiles,
+                'encoder_profile': encoder_profile,
+                'output_path': None,
+                'outputs': {},
+                'error': None,
+                'created_at': time.time(),
+                'started_at': None,
+                'finished_at': None,
+                'worker_pid': None,
+                'timings': [],
+            }
+        self.task_queue.put((job_id, topic, job_dir, output_prefix, profiles, script, encoder_profile))
+        logger.info(f"Queued job {job_id} for topic: {topic}")
+        return job_id
+
+    def submit_batch(self, topics, profiles=None, encoder_profile=None):
+        """Queue a list of topics as one batch and return the batch's ID.
+
+        Repeats of a topic (ignoring case and spacing) share a single job. Only
+        exact repeats: topics with the same words in another order can mean
+        different things ("dog bites man").
+        """
+        profiles = parse_render_profiles(profiles)
+        encoder_profile = parse_encoder_profile(encoder_profile)
+        batch_id = uuid.uuid4().hex
+        job_ids = {}
+        batch_topics = []
+        for topic in topics:
+            key = ' '.join(topic.lower().split())
+            if key not in job_ids:
+                job_ids[key] = self.submit(topic, batch_id=batch_id, profiles=profiles,
+                                           encoder_profile=encoder_profile)
+            batch_topics.append({'topic': topic, 'job_id': job_ids[key]})
+        with self.lock:
+            self.batches[batch_id] = {
+                'batch_id': batch_id,
+                'topics': batch_topics,
+                'job_ids': list(job_ids.values()),
+                'created_at': time.time(),
+            }
+            while len(self.batches) > MAX_BATCHES:
+                self.batches.popitem(last=False)
+        logger.info(f"Queued batch {batch_id}: {len(topics)} topics as {len(job_ids)} jobs")
+        return batch_id
+
+    def get_batch(self, batch_id):
+        """Return a batch with a snapshot of each of its jobs, or None if the batch is unknown."""
+        with self.lock:
+            batch = self.batches.get(batch_id)
+            if batch is None:
+                return None
+            jobs = [dict(self.jobs[job_id]) for job_id in batch['job_ids'] if job_id in self.jobs]
+        return dict(batch, jobs=jobs)
+
+    def wait_finished(self, job_ids, timeout=None):
+        """Yield a snapshot of each of the given jobs as it finishes, in finishing order.
+
+        Stops after timeout seconds even if jobs are still running. Jobs whose
+        worker died are reported failed by the collector; jobs already pruned
+        from memory are yielded as a failed snapshot, so every job gets one.
+        """
+        pending = list(dict.fromkeys(job_ids))
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while pending:
+            with self.lock:
+                while True:
+                    finished = [job_id for job_id in pending
+                                if job_id not in self.jobs or self.jobs[job_id]['status'] in (JOB_DONE, JOB_FAILED)]
+                    if finished:
+                        break
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return
+                    self.job_finished.wait(remaining)
+                snapshots = [dict(self.jobs[job_id]) if job_id in self.jobs else _expired_job(job_id)
+                             for job_id in finished]
+            pending = [job_id for job_id in pending if job_id not in finished]
+            yield from snapshots
+
+    def get(self, job_id):
+        """Return a snapshot of a job's state, or None if the job is unknown."""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def shutdown(self):
+        self.stopping = True
+        for _ in self.workers:
+            self.task_queue.put(None)
+        for worker in self.workers:
+            worker.join(timeout=5)
+            if worker.is_alive() and not worker.daemon:
+                # The stage scheduler is not a daemon, so stop it the way a daemon would be
+                worker.terminate()
+        if self.transcription_service:
+            self.transcription_service.shutdown()
+            self.transcription_service = None
+        self.event_queue.put(None)
+        if self.collector:
+            self.collector.join(timeout=5)
+        self.workers = []
+
+    def _collect_events(self):
+        next_check = time.monotonic() + WORKER_CHECK_INTERVAL
+        while True:
+            try:
+                event = self.event_queue.get(timeout=WORKER_CHECK_INTERVAL)
+            except queue.Empty:
+                event = False
+            if event is None:
+                break
+            if event:
+                self._apply_event(*event)
+            if time.monotonic() >= next_check:
+                self._check_workers()
+                next_check = time.monotonic() + WORKER_CHECK_INTERVAL
+            self._prune_finished()
+
+    def _apply_event(self, job_id, update):
+        if job_id is None:
+            with self.lock:
+                self.stage_load = update['stage_load']
+            pipeline_metrics.set_stage_load(update['stage_load'])
+            return
+        timing = update.pop('timing', None)
+        with self.lock:
+            job = self.jobs.get(job_id)
+            # A job already failed for losing its worker takes no late updates
+            if job is None or job['status'] in (JOB_DONE, JOB_FAILED):
+                return
+            if timing:
+                # Replace rather than append so snapshots handed out by get() stay unchanged
+                job['timings'] = job['timings'] + [timing]
+            job.update(update)
+            if update.get('status') == JOB_FAILED:
+                logger.error(f"Job {job_id} failed: {update['error']}")
+            elif update.get('status') == JOB_DONE:
+                logger.info(f"Job {job_id} finished: {update['output_path']}")
+            if update.get('status') in (JOB_DONE, JOB_FAILED):
+                self.job_finished.notify_all()
+        if timing:
+            pipeline_metrics.observe_stage(timing)
+        if update.get('status') in (JOB_DONE, JOB_FAILED):
+            pipeline_metrics.count_job(update['status'])
+
+    def _check_workers(self):
+        """Fail the running jobs of any worker process that has died and start a replacement."""
+        if self.stopping:
+            return
+        for index, worker in enumerate(self.workers):
+            if worker.is_alive():
+                continue
+            error = f"Worker process exited unexpectedly (exit code {worker.exitcode})"
+            with self.lock:
+                orphaned = [job for job in self.jobs.values()
+                            if job['status'] == JOB_RUNNING and job['worker_pid'] == worker.pid]
+                for job in orphaned:
+                    job.update(_job_failed_event(error))
+                    logger.error(f"Job {job['job_id']} failed: {error}")
+                if orphaned:
+                    self.job_finished.notify_all()
+            for _ in orphaned:
+                pipeline_metrics.count_job(JOB_FAILED)
+            logger.error(f"{error}; starting a replacement")
+            self.workers[index] = self._start_worker(index)
+
+    def _prune_finished(self):
+        """Forget finished jobs beyond MAX_FINISHED_JOBS or older than JOB_RETENTION_SECONDS, deleting their files."""
+        expired = []
+        with self.lock:
+            finished = [job for job in self.jobs.values() if job['status'] in (JOB_DONE, JOB_FAILED)]
+            excess = max(0, len(finished) - MAX_FINISHED_JOBS)
+            cutoff = time.time() - JOB_RETENTION_SECONDS if JOB_RETENTION_SECONDS > 0 else None
+            for i, job in enumerate(finished):
+                if i < excess or (cutoff is not None and job['finished_at'] < cutoff):
+                    expired.append(self.jobs.pop(job['job_id']))
+        for job in expired:
+            shutil.rmtree(job['job_dir'], ignore_errors=True)
+            for path in glob.glob(os.path.join(self.outputs_dir, f"{job['job_id']}_*.mp4")):
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    logger.error(f"Could not delete {path}: {str(e)}")
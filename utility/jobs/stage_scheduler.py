@@ -0,0 +1,153 @@
+import os
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger(__name__)
+
+# Jobs each stage works on at once. Network-bound stages get wide thread pools;
+# render runs in a process pool sized to the cores.
+DEFAULT_STAGE_LIMITS = {
+    'script': 8,
+    'audio': 8,
+    'captions': 4,
+    'search_queries': 8,
+    'search': 8,
+    'download': 8,
+    'render': os.cpu_count() or 1,
+}
+# Overrides, e.g. STAGE_LIMITS="render=2,search=16"
+STAGE_LIMITS = os.getenv('STAGE_LIMITS', '')
+
+def parse_stage_limits(value=STAGE_LIMITS):
+    limits = dict(DEFAULT_STAGE_LIMITS)
+    for item in value.split(','):
+        if '=' in item:
+            stage, limit = item.split('=', 1)
+            limits[stage.strip()] = max(1, int(limit))
+    return limits
+
+def _render_in_process(segments, audio_path, output_dir, profiles, clip_paths, encoder_profile):
+    """Render pool entry point: returns the outputs and the timing measured in the pool process."""
+    from utility.metrics import measure_stage
+    from utility.video.video_generator import render_all_profiles
+    with measure_stage('render') as timing:
+        outputs = render_all_profiles(segments, audio_path, output_dir, profiles, clip_paths, encoder_profile)
+    return outputs, timing
+
+class StageScheduler:
+    """Moves jobs through the pipeline stages, each stage with its own concurrency limit.
+
+    Every stage has its own thread pool, so a job waiting on Pexels in one stage
+    does not hold up another job's render, and render work goes to a process
+    pool. on_load is called with {stage: {'queued': n, 'running': n}} whenever
+    a job enters or leaves a stage.
+    """
+
+    def __init__(self, limits=None, on_load=None):
+        # Imported here so render pool processes, which import this module, stay light
+        from utility.pipeline import PIPELINE_STAGES
+        self.stages = list(PIPELINE_STAGES)
+        self.limits = limits or parse_stage_limits()
+        self.on_load = on_load
+        self.executors = {
+            name: ThreadPoolExecutor(max_workers=self.limits.get(name, 1), thread_name_prefix=f"stage-{name}")
+            for name, _, _, _ in self.stages
+        }
+        self.render_pool = self._new_render_pool()
+        self.render_pool_lock = threading.Lock()
+        self.stage_overrides = {'render': self._render_stage}
+        self.load = {name: {'queued': 0, 'running': 0} for name, _, _, _ in self.stages}
+        self.lock = threading.Lock()
+        self.idle = threading.Condition(self.lock)
+        self.active_jobs = 0
+
+    def submit(self, job, on_stage=None, on_timing=None, on_done=None):
+        """Send a job from start_job() through every stage.
+
+        on_done(job, error) is called once the job has finished all stages
+        (error None) or failed in one (error is the PipelineError).
+        """
+        with self.lock:
+            self.active_jobs += 1
+        self._enqueue(job, 0, (on_stage, on_timing, on_done))
+
+    def _update_load(self, stage, queued=0, running=0):
+        with self.lock:
+            self.load[stage]['queued'] += queued
+            self.load[stage]['running'] += running
+            snapshot = {name: dict(load) for name, load in self.load.items()}
+        if self.on_load:
+            self.on_load(snapshot)
+
+    def _enqueue(self, job, index, callbacks):
+        name = self.stages[index][0]
+        self._update_load(name, queued=1)
+        self.executors[name].submit(self._run, job, index, callbacks)
+
+    def _run(self, job, index, callbacks):
+        from utility.pipeline import run_stage, PipelineError
+        name, message, error_prefix, stage = self.stages[index]
+        on_stage, on_timing, _ = callbacks
+        self._update_load(name, queued=-1, running=1)
+        try:
+            run_stage(job, name, message, error_prefix, self.stage_overrides.get(name, stage), on_stage, on_timing)
+        except PipelineError as e:
+            self._finish(job, callbacks, e)
+            return
+        finally:
+            self._update_load(name, running=-1)
+
+        if index + 1 < len(self.stages):
+            self._enqueue(job, index + 1, callbacks)
+        else:
+            self._finish(job, callbacks, None)
+
+    def _new_render_pool(self):
+        # Spawned rather than forked: this process already runs threads. Each pool
+        # process shares the CPUs out between the renders running beside it.
+        from utility.video.encoder_profiles import set_render_concurrency
+        return ProcessPoolExecutor(max_workers=self.limits['render'], mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=set_render_concurrency, initargs=(self.limits['render'],))
+
+    def _render_stage(self, job):
+        pool = self.render_pool
+        try:
+            future = pool.submit(_render_in_process, job['segments'], job['audio_path'], job['job_dir'],
+                                 job['profiles'], job['clip_paths'], job['encoder_profile'])
+            job['outputs'], timing = future.result()
+        except BrokenProcessPool:
+            # A render process died (out of memory, a crashed encoder) and took the pool with it:
+            # fail the jobs it was running and give later renders a fresh pool
+            with self.render_pool_lock:
+                if self.render_pool is pool:
+                    logger.error("Render process died; starting a new render pool")
+                    self.render_pool = self._new_render_pool()
+                    pool.shutdown(wait=False)
+            raise RuntimeError("Render process exited unexpectedly")
+        return timing
+
+    def _finish(self, job, callbacks, error):
+        from utility.pipeline import finish_job
+        _, _, on_done = callbacks
+        try:
+            finish_job(job)
+            if on_done:
+                on_done(job, error)
+        except Exception as e:
+            logger.error(f"Error finishing job: {str(e)}")
+        finally:
+            with self.lock:
+                self.active_jobs -= 1
+                self.idle.notify_all()
+
+    def shutdown(self):
+        """Wait for every submitted job to finish, then stop the pools."""
+        with self.lock:
+            while self.active_jobs:
+                self.idle.wait()
+        for executor in self.executors.values():
+            executor.shutdown(wait=True)
+        self.render_pool.shutdown(wait=True)
@@ -0,0 +1,202 @@
+import re
+import time
+import threading
+from contextlib import contextmanager
+from utility.http_client import connection_stats, count_requests
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Histogram bucket upper bounds per metric
+WALL_SECONDS_BUCKETS = [0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600]
+CPU_SECONDS_BUCKETS = WALL_SECONDS_BUCKETS
+RSS_BYTES_BUCKETS = [mb * 1024 * 1024 for mb in (128, 256, 512, 1024, 2048, 4096, 8192)]
+
+# Set where stages of different jobs run side by side on threads of one process
+_per_thread = False
+
+def measure_per_thread(enabled=True):
+    """Measure each stage's CPU on its own thread rather than the whole process.
+
+    Use when stages run concurrently in one process: process CPU time and peak
+    RSS would include every other stage running at the time, so stages record
+    their thread's CPU time (without ffmpeg children) and no peak RSS.
+    """
+    global _per_thread
+    _per_thread = enabled
+
+def _cpu_seconds():
+    """CPU time of this process plus its finished children (ffmpeg and friends)."""
+    if resource is None:
+        return time.process_time()
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+def _reset_peak_rss():
+    """Reset the kernel's peak RSS counter for this process; False where unsupported."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def _peak_rss_bytes():
+    try:
+        with open('/proc/self/status') as f:
+            match = re.search(r'VmHWM:\s+(\d+) kB', f.read())
+        if match:
+            return int(match.group(1)) * 1024
+    except OSError:
+        pass
+    if resource is not None:
+        # Lifetime peak; kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return None
+
+@contextmanager
+def measure_stage(stage):
+    """Time a pipeline stage; the yielded dict is filled with wall time, CPU time, peak RSS and HTTP counts on exit.
+
+    record['cpu_scope'] says whether the CPU time is the process's ('process')
+    or the stage thread's ('thread', see measure_per_thread); HTTP counts cover
+    only requests made in this context.
+    """
+    per_thread = _per_thread
+    record = {'stage': stage, 'cpu_scope': 'thread' if per_thread else 'process'}
+    cpu_seconds = time.thread_time if per_thread else _cpu_seconds
+    if not per_thread:
+        _reset_peak_rss()
+    wall_start = time.perf_counter()
+    cpu_start = cpu_seconds()
+    try:
+        with count_requests() as http_counts:
+            yield record
+    finally:
+        record['wall_seconds'] = time.perf_counter() - wall_start
+        record['cpu_seconds'] = cpu_seconds() - cpu_start
+        record['peak_rss_bytes'] = None if per_thread else _peak_rss_bytes()
+        record['http'] = connection_stats.snapshot(http_counts)
+
+def format_bound(bound):
+    """Exact text for a bucket bound: whole numbers without exponent or decimals, others as Python floats."""
+    bound = float(bound)
+    return str(int(bound)) if bound.is_integer() else repr(bound)
+
+class Histogram:
+    """Prometheus-style cumulative histogram with one series per label value."""
+
+    def __init__(self, name, help_text, buckets, label):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.label = label
+        self.series = {}
+
+    def observe(self, label_value, value):
+        series = self.series.setdefault(label_value, {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0})
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series['counts'][i] += 1
+        series['sum'] += value
+        series['count'] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label_value, series in sorted(self.series.items()):
+            label = f'{self.label}="{label_value}"'
+            for bound, count in zip(self.buckets, series['counts']):
+                lines.append(f'{self.name}_bucket{{{label},le="{format_bound(bound)}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {series["count"]}')
+            lines.append(f'{self.name}_sum{{{label}}} {series["sum"]:.6f}')
+            lines.append(f'{self.name}_count{{{label}}} {series["count"]}')
+        return lines
+
+class PipelineMetrics:
+    """Per-stage histograms and job counters, exposed in the Prometheus text format."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.wall_seconds = Histogram("pipeline_stage_wall_seconds", "Wall time per pipeline stage.",
+                                      WALL_SECONDS_BUCKETS, "stage")
+        self.cpu_seconds = Histogram("pipeline_stage_cpu_seconds",
+                                     "CPU time per pipeline stage; the stage's own thread when stages run concurrently.",
+                                     CPU_SECONDS_BUCKETS, "stage")
+        self.peak_rss_bytes = Histogram("pipeline_stage_peak_rss_bytes",
+                                        "Peak worker RSS per pipeline stage; not recorded when stages run concurrently.",
+                                        RSS_BYTES_BUCKETS, "stage")
+        self.jobs = {}
+        # (stage, counter) -> outbound HTTP total
+        self.http = {}
+        # Latest per-stage {'queued': n, 'running': n} from the stage scheduler
+        self.stage_load = {}
+        # name -> DiskCache; its counters live in its database, so every worker's lookups are included
+        self.caches = {}
+
+    def register_cache(self, name, cache):
+        with self.lock:
+            self.caches[name] = cache
+
+    def _render_caches(self):
+        with self.lock:
+            caches = dict(self.caches)
+        if not caches:
+            return []
+        lookups = ["# HELP pipeline_cache_lookups_total Disk cache lookups by cache and result.",
+                   "# TYPE pipeline_cache_lookups_total counter"]
+        entries = ["# HELP pipeline_cache_entries Entries held by each disk cache.", "# TYPE pipeline_cache_entries gauge"]
+        for name, cache in sorted(caches.items()):
+            try:
+                stats = cache.stats()
+            except Exception:  # An unreadable cache should not take the rest of /metrics down
+                continue
+            lookups.append(f'pipeline_cache_lookups_total{{cache="{name}",result="hit"}} {stats["hits"]}')
+            lookups.append(f'pipeline_cache_lookups_total{{cache="{name}",result="miss"}} {stats["misses"]}')
+            entries.append(f'pipeline_cache_entries{{cache="{name}"}} {stats["entries"]}')
+        return lookups + entries
+
+    def set_stage_load(self, stage_load):
+        with self.lock:
+            self.stage_load = dict(stage_load)
+
+    def observe_stage(self, record):
+        with self.lock:
+            self.wall_seconds.observe(record['stage'], record['wall_seconds'])
+            self.cpu_seconds.observe(record['stage'], record['cpu_seconds'])
+            if record.get('peak_rss_bytes') is not None:
+                self.peak_rss_bytes.observe(record['stage'], record['peak_rss_bytes'])
+            for name, count in record.get('http', {}).items():
+                self.http[(record['stage'], name)] = self.http.get((record['stage'], name), 0) + count
+
+    def count_job(self, status):
+        with self.lock:
+            self.jobs[status] = self.jobs.get(status, 0) + 1
+
+    def render(self):
+        with self.lock:
+            lines = ["# HELP pipeline_jobs_total Finished jobs by status.", "# TYPE pipeline_jobs_total counter"]
+            for status, count in sorted(self.jobs.items()):
+                lines.append(f'pipeline_jobs_total{{status="{status}"}} {count}')
+            for name, key, help_text in (
+                ("pipeline_stage_queue_depth", "queued", "Jobs waiting for each pipeline stage."),
+                ("pipeline_stage_running", "running", "Jobs currently in each pipeline stage."),
+            ):
+                if self.stage_load:
+                    lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} gauge"])
+                for stage, load in self.stage_load.items():
+                    lines.append(f'{name}{{stage="{stage}"}} {load[key]}')
+            if self.http:
+                lines.extend(["# HELP pipeline_http_total Outbound HTTP requests, connections and retries per stage.",
+                              "# TYPE pipeline_http_total counter"])
+            for (stage, name), count in sorted(self.http.items()):
+                lines.append(f'pipeline_http_total{{stage="{stage}",counter="{name}"}} {count}')
+            for histogram in (self.wall_seconds, self.cpu_seconds, self.peak_rss_bytes):
+                lines.extend(histogram.render())
+        # Reading the cache counters is database I/O, so it happens outside the lock
+        lines.extend(self._render_caches())
+        return "\n".join(lines) + "\n"
+
+pipeline_metrics = PipelineMetrics()
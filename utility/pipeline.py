@@ -0,0 +1,163 @@
+import os
+import logging
+import traceback
+from utility.script.script_generator import generate_script
+from utility.audio.audio_generator import AudioStream
+from utility.captions.timed_captions_generator import generate_timed_captions_for_chunks
+from utility.video.video_search_query_generator import getVideoSearchQueriesTimed, merge_empty_intervals
+from utility.video.async_video_search import search_segments
+from utility.video.video_generator import render_all_profiles, ClipPrefetcher
+from utility.video.media_store import media_store
+from utility.video.render_profiles import parse_render_profiles
+from utility.video.encoder_profiles import parse_encoder_profile
+from utility.metrics import measure_stage
+from utility.http_client import connection_stats
+from utility.artifact_cache import artifact_cache, artifact_store, artifact_key
+from utility.video.search_cache import search_cache
+from utility.script.script_cache import script_cache
+
+logger = logging.getLogger(__name__)
+
+class PipelineError(Exception):
+    """Raised when a pipeline stage fails; carries the name of the failing stage."""
+    def __init__(self, stage, message):
+        super().__init__(message)
+        self.stage = stage
+
+def stage_script(job):
+    # An edited script can be passed in with the job instead of generating one
+    if not job.get('script'):
+        job['script'] = generate_script(job['topic'])
+    with open(os.path.join(job['job_dir'], "script.txt"), "w", encoding="utf-8") as f:
+        f.write(job['script'])
+    logger.info(f"Script cache: {script_cache.stats()}")
+
+def stage_audio(job):
+    # Synthesis continues in the background; captioning starts on the first chunks
+    job['audio_stream'] = AudioStream(job['script'], job['job_dir'])
+    # Wait for the first chunk so synthesis failures are reported by this stage
+    next(iter(job['audio_stream']), None)
+
+def stage_captions(job):
+    captions_timed = generate_timed_captions_for_chunks(job['audio_stream'])
+    job['audio_path'] = job['audio_stream'].save(os.path.join(job['job_dir'], "audio_tts.wav"))
+    with open(os.path.join(job['job_dir'], "captions_timed.txt"), "w", encoding="utf-8") as f:
+        f.write(str(captions_timed))
+    job['captions_timed'] = captions_timed
+
+def stage_search_queries(job):
+    job['search_queries'] = getVideoSearchQueriesTimed(job['script'], job['captions_timed'])
+
+def stage_search(job):
+    # Clip downloads start while the remaining segments are still being searched
+    job['prefetcher'] = ClipPrefetcher()
+    segments = search_segments(job['search_queries'], on_url=job['prefetcher'].prefetch)
+
+    # Merge segments with no videos
+    job['segments'] = merge_empty_intervals(segments)
+
+def stage_download(job):
+    # Downloads started during search unless its output was reused; wait for any still in flight
+    prefetcher = job.setdefault('prefetcher', ClipPrefetcher())
+    job['clip_paths'] = {url: prefetcher.get(url) for _, url in job['segments'] if url}
+    # The downloads ran on the prefetcher's threads; count them as this stage's requests
+    connection_stats.add(prefetcher.http)
+    logger.info(f"Media store: {media_store.stats()}")
+    logger.info(f"Search cache: {search_cache.stats()}")
+    logger.info(f"HTTP connections (process): {connection_stats.snapshot()}")
+
+def stage_render(job):
+    job['outputs'] = render_all_profiles(job['segments'], job['audio_path'], job['job_dir'], job['profiles'],
+                                         job['clip_paths'], job['encoder_profile'])
+    logger.info(f"Artifact store: {artifact_store.stats()}, artifact cache: {artifact_cache.stats()}")
+
+# (name, progress message, error message prefix, stage function)
+PIPELINE_STAGES = [
+    ("script", "Generating script...", "Error generating script", stage_script),
+    ("audio", "Generating audio...", "Error generating audio", stage_audio),
+    ("captions", "Generating timed captions...", "Error generating captions", stage_captions),
+    ("search_queries", "Generating video search queries...", "Error generating search queries", stage_search_queries),
+    ("search", "Searching for videos...", "Error searching for videos", stage_search),
+    ("download", "Downloading videos...", "Error downloading videos", stage_download),
+    ("render", "Creating final video...", "Error creating video", stage_render),
+]
+
+# Stages whose outputs are plain data: name -> (job keys read, job keys written).
+# Their outputs are stored under a hash of their inputs and reused when the inputs
+# repeat. Audio and render cache per chunk and per segment instead.
+CACHED_STAGES = {
+    "search_queries": (("script", "captions_timed"), ("search_queries",)),
+    "search": (("search_queries",), ("segments",)),
+}
+
+def start_job(topic, job_dir, profiles=None, script=None, encoder_profile=None):
+    """Create the state dict that the stages of one job read and fill in."""
+    os.makedirs(job_dir, exist_ok=True)
+    logger.info(f"Starting video generation for topic: {topic}")
+    return {'topic': topic, 'job_dir': job_dir, 'profiles': parse_render_profiles(profiles), 'script': script,
+            'encoder_profile': parse_encoder_profile(encoder_profile)}
+
+def finish_job(job):
+    """Release what a job holds once it has finished or failed."""
+    if job.get('prefetcher'):
+        job['prefetcher'].shutdown()
+
+def run_cached(job, name, stage):
+    """Run a stage, or restore its outputs from the artifact cache if it already ran on the same inputs."""
+    if name not in CACHED_STAGES:
+        return stage(job)
+    inputs, outputs = CACHED_STAGES[name]
+    key = artifact_key(name, [job[input_key] for input_key in inputs])
+    cached = artifact_cache.get(key)
+    if cached is not None:
+        logger.info(f"Reusing stored {name} output")
+        job.update(cached)
+        return None
+    result = stage(job)
+    artifact_cache.set(key, {output_key: job[output_key] for output_key in outputs})
+    return result
+
+def run_stage(job, name, message, error_prefix, stage, on_stage=None, on_timing=None):
+    """Run one stage on a job, timing it, and raise PipelineError if it fails.
+
+    A stage that does its work in another process may return the timing
+    record measured there; its CPU time, peak RSS and HTTP counts replace this process's.
+    """
+    logger.info(message)
+    if on_stage:
+        on_stage(name)
+    try:
+        with measure_stage(name) as timing:
+            remote_timing = run_cached(job, name, stage)
+        if isinstance(remote_timing, dict):
+            timing['cpu_scope'] = remote_timing['cpu_scope']
+            timing['cpu_seconds'] = remote_timing['cpu_seconds']
+            timing['peak_rss_bytes'] = remote_timing['peak_rss_bytes']
+            timing['http'] = remote_timing['http']
+    except Exception as e:
+        logger.error(f"{error_prefix}: {str(e)}")
+        logger.error(traceback.format_exc())
+        raise PipelineError(name, f"{error_prefix}: {str(e)}") from e
+    finally:
+        logger.info(f"Stage {name} took {timing['wall_seconds']:.2f}s wall, {timing['cpu_seconds']:.2f}s CPU")
+        if on_timing:
+            on_timing(timing)
+
+def run_pipeline(topic, job_dir, on_stage=None, on_timing=None, profiles=None, script=None, encoder_profile=None):
+    """Run every stage for a topic inside job_dir and return {render profile: rendered video path}.
+
+    profiles lists render profile names (default RENDER_PROFILES) and
+    encoder_profile names the encoder settings (default ENCODER_PROFILE). script
+    replaces the generated script, e.g. after an edit. on_stage is
+    called with each stage name as it starts, and on_timing with each stage's
+    wall time, CPU time and peak RSS once it ends.
+    """
+    job = start_job(topic, job_dir, profiles, script, encoder_profile)
+    try:
+        for name, message, error_prefix, stage in PIPELINE_STAGES:
+            run_stage(job, name, message, error_prefix, stage, on_stage, on_timing)
+    finally:
+        finish_job(job)
+
+    logger.info(f"Video rendering complete: {job['outputs']}")
+    return job['outputs']
@@ -0,0 +1,102 @@
+import os
+from bisect import bisect_right
+from functools import lru_cache
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+from moviepy.editor import VideoClip
+
+CAPTION_FONT = os.getenv('CAPTION_FONT', 'DejaVuSans-Bold.ttf')
+
+@lru_cache(maxsize=32)
+def load_font(font, fontsize):
+    try:
+        return ImageFont.truetype(font, fontsize)
+    except OSError:
+        print(f"Font {font} not found, using the default font")
+        return ImageFont.load_default(size=fontsize)
+
+def wrap_caption(text, pil_font, stroke_width, max_width):
+    """Split text into lines no wider than max_width, breaking between words.
+
+    A single word wider than max_width gets a line of its own.
+    """
+    lines = []
+    for word in text.split():
+        candidate = f"{lines[-1]} {word}" if lines else word
+        if lines and pil_font.getlength(candidate) + 2 * stroke_width <= max_width:
+            lines[-1] = candidate
+        else:
+            lines.append(word)
+    return lines or [text]
+
+@lru_cache(maxsize=1024)
+def render_caption(text, font, fontsize, color, stroke_width, stroke_color, max_width=None):
+    """Rasterize a caption once and return its (RGB, alpha mask) arrays, cached by text and style.
+
+    With max_width the caption is wrapped onto as many centred lines as it needs.
+    """
+    pil_font = load_font(font, fontsize)
+    lines = wrap_caption(text, pil_font, stroke_width, max_width) if max_width else [text]
+    boxes = [pil_font.getbbox(line, stroke_width=stroke_width) for line in lines]
+    ascent, descent = pil_font.getmetrics()
+    line_height = ascent + descent + 2 * stroke_width
+    top = min(box[1] for box in boxes)
+    width = max(1, max(right - left for left, _, right, _ in boxes))
+    height = max(1, line_height * (len(lines) - 1) + boxes[-1][3] - top)
+    image = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    for i, (line, (left, _, right, _)) in enumerate(zip(lines, boxes)):
+        draw.text(((width - (right - left)) // 2 - left, i * line_height - top), line, font=pil_font, fill=color,
+                  stroke_width=stroke_width, stroke_fill=stroke_color)
+    pixels = np.array(image)
+    rgb = pixels[:, :, :3]
+    mask = pixels[:, :, 3] / 255.0
+    # Cached bitmaps are shared between frames, so keep them read-only
+    rgb.flags.writeable = False
+    mask.flags.writeable = False
+    return rgb, mask
+
+def make_caption_overlay(timed_captions, width, y, font=CAPTION_FONT, fontsize=100, color="white",
+                         stroke_width=3, stroke_color="black"):
+    """Build one masked clip that shows every timed caption, horizontally centred, at height y.
+
+    The overlay is a single band as wide as the video, so all captions are
+    composited as one layer instead of one TextClip per caption. Captions
+    wider than the video wrap onto more lines; a single word that is still
+    too wide is cropped equally on both sides.
+    """
+    captions = sorted(timed_captions, key=lambda caption: caption[0][0])
+    starts = [t1 for (t1, t2), text in captions]
+    bitmaps = [render_caption(text, font, fontsize, color, stroke_width, stroke_color, width) for _, text in captions]
+    band_height = max((rgb.shape[0] for rgb, _ in bitmaps), default=1)
+    duration = max((t2 for (t1, t2), _ in captions), default=0)
+
+    # Consecutive frames show the same caption, so keep the last composed band
+    last_band = {}
+
+    def caption_index(t):
+        index = bisect_right(starts, t) - 1
+        if index >= 0 and t < captions[index][0][1]:
+            return index
+        return None
+
+    def band(t):
+        index = caption_index(t)
+        if last_band.get('index', -1) != index or 'rgb' not in last_band:
+            rgb = np.zeros((band_height, width, 3), dtype=np.uint8)
+            mask = np.zeros((band_height, width))
+            if index is not None:
+                caption_rgb, caption_mask = bitmaps[index]
+                caption_height, caption_width = caption_mask.shape
+                # Centre the caption, cropping both sides of one that is wider than the band
+                crop = max(0, caption_width - width) // 2
+                caption_width = min(caption_width, width)
+                x = (width - caption_width) // 2
+                rgb[:caption_height, x:x + caption_width] = caption_rgb[:, crop:crop + caption_width]
+                mask[:caption_height, x:x + caption_width] = caption_mask[:, crop:crop + caption_width]
+            last_band.update(index=index, rgb=rgb, mask=mask)
+        return last_band
+
+    overlay = VideoClip(lambda t: band(t)['rgb'], duration=duration)
+    overlay = overlay.set_mask(VideoClip(lambda t: band(t)['mask'], ismask=True, duration=duration))
+    return overlay.set_position((0, y))
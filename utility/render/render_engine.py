@@ -1,26 +1,22 @@
-import time
 import os
 import tempfile
-import zipfile
 import platform
 import subprocess
-from moviepy.editor import (AudioFileClip, CompositeVideoClip, CompositeAudioClip, ImageClip,
-                            TextClip, VideoFileClip)
-from moviepy.audio.fx.audio_loop import audio_loop
-from moviepy.audio.fx.audio_normalize import audio_normalize
-import requests
+from moviepy.editor import AudioFileClip, CompositeVideoClip, CompositeAudioClip, VideoFileClip
 import logging
+from utility.http_client import http_get
+from utility.render.caption_renderer import make_caption_overlay
+from utility.video.encoder_profiles import encoder_settings, write_videofile_args
 
 # Configure logging
 logging.basicConfig(filename="render_engine.log", level=logging.DEBUG, format="%(asctime)s - %(levelname)s - %(message)s")
 
 def download_file(url, filename):
-    with open(filename, 'wb') as f:
-        headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        }
-        response = requests.get(url, headers=headers)
-        f.write(response.content)
+    with http_get(url, stream=True) as response:
+        response.raise_for_status()
+        with open(filename, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=1024 * 1024):
+                f.write(chunk)
 
 def search_program(program_name):
     try: 
@@ -35,12 +31,6 @@ def get_program_path(program_name):
 
 def get_output_media(audio_file_path, timed_captions, background_video_data, video_server):
     OUTPUT_FILE_NAME = "rendered_video.mp4"
-    magick_path = get_program_path("magick")
-    logging.debug(f"ImageMagick path: {magick_path}")
-    if magick_path:
-        os.environ['IMAGEMAGICK_BINARY'] = magick_path
-    else:
-        os.environ['IMAGEMAGICK_BINARY'] = '/usr/bin/convert'
     
     visual_clips = []
     try:
@@ -79,25 +69,24 @@ def get_output_media(audio_file_path, timed_captions, background_video_data, vid
         logging.error(f"Failed to load audio file {audio_file_path}: {e}")
         return None
 
+    # Captions are rasterized in-process once per unique text and drawn as one overlay layer
+    video_size = visual_clips[0].size if visual_clips else (1920, 1080)
     try:
-        for (t1, t2), text in timed_captions:
-            text_clip = TextClip(txt=text, fontsize=100, color="white", stroke_width=3, stroke_color="black", method="label")
-            text_clip = text_clip.set_start(t1)
-            text_clip = text_clip.set_end(t2)
-            text_clip = text_clip.set_position(["center", 800])
-            visual_clips.append(text_clip)
+        caption_overlay = make_caption_overlay(timed_captions, width=video_size[0], y=800, fontsize=100,
+                                               color="white", stroke_width=3, stroke_color="black")
+        visual_clips.append(caption_overlay)
     except Exception as e:
-        logging.error(f"Error while creating text clips: {e}")
+        logging.error(f"Error while creating caption overlay: {e}")
 
     try:
-        video = CompositeVideoClip(visual_clips)
+        video = CompositeVideoClip(visual_clips, size=video_size)
         if audio_clips:
             audio = CompositeAudioClip(audio_clips)
             video.duration = audio.duration
             video.audio = audio
 
         logging.debug(f"Writing video to file: {OUTPUT_FILE_NAME}")
-        video.write_videofile(OUTPUT_FILE_NAME, codec='libx264', audio_codec='aac', fps=25, preset='veryfast')
+        video.write_videofile(OUTPUT_FILE_NAME, **write_videofile_args(encoder_settings()))
     except Exception as e:
         logging.error(f"Failed to render video: {e}")
         return None
@@ -0,0 +1,63 @@
+import os
+import re
+from utility.disk_cache import DiskCache
+
+SCRIPT_CACHE_PATH = os.getenv('SCRIPT_CACHE_PATH', '.cache/script_cache.sqlite3')
+SCRIPT_CACHE_TTL = int(os.getenv('SCRIPT_CACHE_TTL', 7 * 24 * 60 * 60))  # seconds
+SCRIPT_CACHE_MAX_ENTRIES = int(os.getenv('SCRIPT_CACHE_MAX_ENTRIES', 5000))
+# Minimum token-set similarity for reusing another topic's script; 1 only reuses exact token sets
+SCRIPT_CACHE_SIMILARITY = float(os.getenv('SCRIPT_CACHE_SIMILARITY', 0.8))
+
+# Words that do not change what a topic is about
+STOPWORDS = {
+    "a", "an", "the", "of", "about", "on", "in", "for", "and", "to", "with",
+    "facts", "fact", "fun", "interesting", "cool", "amazing", "video", "some",
+}
+
+# Generated scripts shared by every worker process
+script_cache = DiskCache(SCRIPT_CACHE_PATH, ttl=SCRIPT_CACHE_TTL, max_entries=SCRIPT_CACHE_MAX_ENTRIES)
+
+def topic_tokens(topic):
+    """Content words of a topic, lowercased, in sorted order.
+
+    Words are kept as written: stripping plurals merged unrelated words
+    ("news" and "new", "Paris" and "pari").
+    """
+    return sorted({word for word in re.findall(r"\w+", topic.lower()) if word not in STOPWORDS})
+
+def script_cache_key(topic):
+    """Normalized topic: "Facts about space" and "space facts" share the key "space"."""
+    return ' '.join(topic_tokens(topic)) or ' '.join(topic.lower().split())
+
+def token_set_similarity(a, b):
+    a, b = set(a), set(b)
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+def get_cached_script(topic, similarity=SCRIPT_CACHE_SIMILARITY):
+    """Return the cached script for topic or, failing that, for the most similar cached topic."""
+    key = script_cache_key(topic)
+    entry = script_cache.get(key)
+    if entry is not None:
+        return entry['script']
+    if similarity >= 1:
+        return None
+
+    # A key is its topic's sorted tokens, so candidates are scored without loading their scripts
+    tokens = topic_tokens(topic)
+    best_score, best_key = 0.0, None
+    for cached_key in script_cache.keys():
+        score = token_set_similarity(tokens, cached_key.split())
+        if score > best_score:
+            best_score, best_key = score, cached_key
+    if best_key is not None and best_score >= similarity:
+        # Also refreshes the matched entry's LRU position
+        entry = script_cache.get(best_key)
+        if entry is not None:
+            print(f"Reusing script for '{entry['topic']}' for topic '{topic}' (similarity {best_score:.2f})")
+            return entry['script']
+    return None
+
+def cache_script(topic, script):
+    script_cache.set(script_cache_key(topic), {'topic': topic, 'script': script})
@@ -1,12 +1,28 @@
 import google.generativeai as genai
 import os
+import sys
 from dotenv import load_dotenv
+from utility.script.script_cache import get_cached_script, cache_script
 
 load_dotenv()
 
 # Configure the API key
 genai.configure(api_key=os.getenv('GOOGLE_API_KEY'))
 
+SCRIPT_MODEL = os.getenv('SCRIPT_MODEL', 'gemini-1.0-pro')
+
+_model = None
+_model_pid = None
+
+def get_model():
+    """Return this process's model client, created on first use."""
+    global _model, _model_pid
+    # gRPC channels do not survive a fork, so each worker process builds its own
+    if _model is None or _model_pid != os.getpid():
+        _model = genai.GenerativeModel(SCRIPT_MODEL)
+        _model_pid = os.getpid()
+    return _model
+
 def get_fallback_script(topic):
     """Generate a fallback script based on the topic."""
     if "cloud" in topic.lower():
@@ -34,10 +50,14 @@ def get_fallback_script(topic):
 - Modern technology has helped us better understand {topic}.
 - There's still much to learn about {topic}."""
 
-def generate_script(topic):
+def generate_script(topic, use_cache=True):
+    if use_cache:
+        script = get_cached_script(topic)
+        if script:
+            return script
+
     try:
-        # Initialize the model with the correct name
-        model = genai.GenerativeModel('gemini-1.0-pro')
+        model = get_model()
         
         # Create the prompt
         prompt = f"""Create a short, engaging script about {topic}. The script should:
@@ -52,6 +72,8 @@ def generate_script(topic):
         response = model.generate_content(prompt)
         
         if response and response.text:
+            # Fallback scripts are not cached, so a later request can still get a real one
+            cache_script(topic, response.text)
             return response.text
         else:
             return get_fallback_script(topic)
@@ -59,3 +81,13 @@ def generate_script(topic):
     except Exception as e:
         print(f"Error generating script: {str(e)}")
         return get_fallback_script(topic)
+
+def precompute_scripts(topics):
+    """Generate and cache scripts ahead of time, e.g. for trending topics."""
+    for topic in topics:
+        generate_script(topic, use_cache=False)
+        print(f"Cached script for topic: {topic}")
+
+if __name__ == '__main__':
+    # python -m utility.script.script_generator "black holes" "volcanoes" ...
+    precompute_scripts(sys.argv[1:])
@@ -1,6 +1,12 @@
 import os
-from datetime import datetime
+import gzip
 import json
+import time
+import queue
+import random
+import threading
+import multiprocessing.util
+from datetime import datetime
 
 # Log types
 LOG_TYPE_GPT = "GPT"
@@ -10,25 +16,147 @@ LOG_TYPE_PEXEL = "PEXEL"
 DIRECTORY_LOG_GPT = ".logs/gpt_logs"
 DIRECTORY_LOG_PEXEL = ".logs/pexel_logs"
 
+# log type -> (directory, segment file prefix)
+LOG_DESTINATIONS = {
+    LOG_TYPE_GPT: (DIRECTORY_LOG_GPT, "gpt"),
+    LOG_TYPE_PEXEL: (DIRECTORY_LOG_PEXEL, "pexel"),
+}
+
+# Fraction of responses logged per type, e.g. LOG_SAMPLE_RATE_PEXEL=0.1
+LOG_SAMPLE_RATES = {
+    log_type: float(os.getenv(f'LOG_SAMPLE_RATE_{log_type}', 1.0)) for log_type in LOG_DESTINATIONS
+}
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))  # Entries waiting for the writer; more are dropped
+LOG_SEGMENT_BYTES = int(os.getenv('LOG_SEGMENT_BYTES', 16 * 1024 * 1024))  # Uncompressed size before rotating
+LOG_FLUSH_INTERVAL = 1.0  # seconds
+LOG_FLUSH_BYTES = 1024 * 1024  # Uncompressed bytes buffered per segment before they are written out
+
+class ResponseLogSink:
+    """Writes log entries from a background thread to rotating gzip-compressed JSONL segments.
+
+    Callers only pay for an enqueue; when the bounded queue is full the entry
+    is dropped and counted rather than blocking the request. Every flush
+    appends a complete gzip member, so a segment can be read (gzip.open reads
+    all members) even if the process dies before closing it.
+    """
+
+    def __init__(self, destinations=LOG_DESTINATIONS, sample_rates=LOG_SAMPLE_RATES,
+                 max_queue=LOG_QUEUE_SIZE, segment_bytes=LOG_SEGMENT_BYTES):
+        self.destinations = destinations
+        self.sample_rates = sample_rates
+        self.max_queue = max_queue
+        self.segment_bytes = segment_bytes
+        self.lock = threading.Lock()
+        self.queue = None
+        self.thread = None
+        self.pid = None
+        self.dropped = 0
+        self.segments = {}
+
+    def _ensure_started(self):
+        # The writer thread does not survive a fork, so each process starts its own
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid != os.getpid():
+                self.queue = queue.Queue(maxsize=self.max_queue)
+                self.segments = {}
+                self.thread = threading.Thread(target=self._run, name="response-log-writer", daemon=True)
+                self.thread.start()
+                self.pid = os.getpid()
+                # Unlike atexit, runs when a multiprocessing child exits too
+                multiprocessing.util.Finalize(self, self.close, exitpriority=10)
+
+    def log(self, log_type, entry):
+        if random.random() >= self.sample_rates.get(log_type, 1.0):
+            return
+        self._ensure_started()
+        try:
+            self.queue.put_nowait((log_type, entry))
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+
+    def _open_segment(self, log_type):
+        directory, prefix = self.destinations[log_type]
+        os.makedirs(directory, exist_ok=True)
+        # Process ID and a sequence number keep names unique across workers and fast rotations
+        sequence = self.segments.get(log_type, {}).get('sequence', 0) + 1
+        filename = f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.getpid()}_{sequence:04d}.jsonl.gz"
+        segment = {'path': os.path.join(directory, filename), 'lines': [], 'buffered': 0, 'bytes': 0,
+                   'sequence': sequence}
+        self.segments[log_type] = segment
+        return segment
+
+    def _write(self, log_type, entry):
+        segment = self.segments.get(log_type)
+        if segment is None or segment['path'] is None:
+            segment = self._open_segment(log_type)
+        line = json.dumps(entry, default=str) + '\n'
+        segment['lines'].append(line)
+        segment['buffered'] += len(line)
+        segment['bytes'] += len(line)
+        if segment['bytes'] >= self.segment_bytes:
+            self._flush_segment(segment)
+            segment['path'] = None
+        elif segment['buffered'] >= LOG_FLUSH_BYTES:
+            self._flush_segment(segment)
+
+    def _flush_segment(self, segment):
+        if not segment['lines']:
+            return
+        data = gzip.compress(''.join(segment['lines']).encode('utf-8'))
+        segment['lines'] = []
+        segment['buffered'] = 0
+        with open(segment['path'], 'ab') as f:
+            f.write(data)
+
+    def _flush(self):
+        for segment in self.segments.values():
+            if segment['path'] is not None:
+                self._flush_segment(segment)
+
+    def _run(self):
+        log_queue = self.queue
+        # Segments are written out once per LOG_FLUSH_INTERVAL; _write also flushes any that reach LOG_FLUSH_BYTES
+        flushed_at = time.monotonic()
+        while True:
+            try:
+                item = log_queue.get(timeout=max(0.0, flushed_at + LOG_FLUSH_INTERVAL - time.monotonic()))
+            except queue.Empty:
+                item = False
+            if item is None:
+                break
+            try:
+                if item:
+                    self._write(*item)
+                if time.monotonic() - flushed_at >= LOG_FLUSH_INTERVAL:
+                    self._flush()
+                    flushed_at = time.monotonic()
+            except Exception as e:
+                print(f"Error writing response log: {str(e)}")
+        self._close_segments()
+
+    def _close_segments(self):
+        self._flush()
+        for segment in self.segments.values():
+            segment['path'] = None
+
+    def close(self):
+        """Write out everything queued so far and stop the writer thread."""
+        if self.pid != os.getpid() or self.thread is None:
+            return
+        self.queue.put(None)
+        self.thread.join(timeout=10)
+        self.pid = None
+        self.thread = None
+
+response_log = ResponseLogSink()
+
 # method to log response from pexel and openai
 def log_response(log_type, query,response):
-    log_entry = {
+    response_log.log(log_type, {
         "query": query,
         "response": response,
         "timestamp": datetime.now().isoformat()
-    }
-    if log_type == LOG_TYPE_GPT:
-        if not os.path.exists(DIRECTORY_LOG_GPT):
-            os.makedirs(DIRECTORY_LOG_GPT)
-        filename = '{}_gpt3.txt'.format(datetime.now().strftime("%Y%m%d_%H%M%S"))
-        filepath = os.path.join(DIRECTORY_LOG_GPT, filename)
-        with open(filepath, "w") as outfile:
-            outfile.write(json.dumps(log_entry) + '\n')
-
-    if log_type == LOG_TYPE_PEXEL:
-        if not os.path.exists(DIRECTORY_LOG_PEXEL):
-            os.makedirs(DIRECTORY_LOG_PEXEL)
-        filename = '{}_pexel.txt'.format(datetime.now().strftime("%Y%m%d_%H%M%S"))
-        filepath = os.path.join(DIRECTORY_LOG_PEXEL, filename)
-        with open(filepath, "w") as outfile:
-            outfile.write(json.dumps(log_entry) + '\n')
+    })
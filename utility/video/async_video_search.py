@@ -0,0 +1,141 @@
+import os
+import time
+import asyncio
+import threading
+import aiohttp
+from utility.video.video_search_query_generator import (PEXELS_API_KEY, RATE_LIMIT_DELAY, MAX_RETRIES,
+                                                        clean_search_query, pick_video_link)
+from utility.video.search_cache import search_cache, search_cache_key
+from utility.http_client import (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, HTTP_POOL_PER_HOST, RETRY_STATUSES, USER_AGENT,
+                                 backoff_delay, retry_after_delay, connection_stats, aiohttp_trace_config)
+
+PEXELS_SEARCH_URL = "https://api.pexels.com/videos/search"
+
+# Token bucket sizing. The bucket is kept in the search cache database, so this
+# budget is shared by every worker process: set it to the Pexels account quota.
+# The default matches the old fixed RATE_LIMIT_DELAY spacing.
+PEXELS_REQUESTS_PER_HOUR = float(os.getenv('PEXELS_REQUESTS_PER_HOUR', 3600 / RATE_LIMIT_DELAY))
+PEXELS_BURST = int(os.getenv('PEXELS_BURST', 10))
+PEXELS_MAX_CONCURRENCY = int(os.getenv('PEXELS_MAX_CONCURRENCY', 8))
+PEXELS_REQUEST_TIMEOUT = 30  # seconds
+
+class TokenBucket:
+    """Token bucket rate limiter that can be shared by every event loop in the process.
+
+    With a DiskCache as store, the bucket's state lives in its database and is
+    shared by every process using that database.
+    """
+
+    def __init__(self, rate, capacity, store=None, name=None):
+        self.rate = rate
+        self.capacity = capacity
+        self.store = store
+        self.name = name
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """Take a token and return how many seconds the caller must wait before using it."""
+        if self.store is not None:
+            return self.store.reserve_token(self.name, self.rate, self.capacity)
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0
+            return -self.tokens / self.rate
+
+    async def acquire(self):
+        # The shared bucket is a SQLite write, so keep it off the event loop
+        delay = await asyncio.to_thread(self.reserve) if self.store is not None else self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+pexels_rate_limiter = TokenBucket(PEXELS_REQUESTS_PER_HOUR / 3600, PEXELS_BURST, store=search_cache, name='pexels')
+
+async def search_pexels_videos_async(session, query, per_page=1):
+    """Async counterpart of search_pexels_videos that paces requests with the shared token bucket."""
+    params = {'query': clean_search_query(query), 'per_page': per_page}
+    cache_key = search_cache_key(params['query'], per_page=per_page)
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        return pick_video_link(cached)
+
+    # Single flight: when jobs in other workers search the same query, one asks Pexels
+    lock = await asyncio.to_thread(search_cache.lock_key, cache_key)
+    try:
+        cached = search_cache.get(cache_key)
+        if cached is not None:
+            return pick_video_link(cached)
+        return await _fetch_search(session, params, cache_key)
+    finally:
+        search_cache.unlock_key(lock)
+
+async def _fetch_search(session, params, cache_key):
+    for attempt in range(MAX_RETRIES):
+        await pexels_rate_limiter.acquire()
+        try:
+            async with session.get(PEXELS_SEARCH_URL, params=params) as response:
+                if response.status in RETRY_STATUSES and attempt < MAX_RETRIES - 1:
+                    delay = retry_after_delay(response.headers)
+                    if delay is None:
+                        delay = backoff_delay(attempt)
+                    print(f"Pexels returned {response.status}. Retrying in {delay:.1f} seconds...")
+                    connection_stats.count('retries')
+                    await asyncio.sleep(delay)
+                    continue
+                response.raise_for_status()
+                data = await response.json()
+            search_cache.set(cache_key, data)
+            return pick_video_link(data)
+
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if attempt < MAX_RETRIES - 1:
+                delay = backoff_delay(attempt)
+                print(f"Attempt {attempt + 1} failed: {str(e)}. Retrying in {delay:.1f} seconds...")
+                connection_stats.count('retries')
+                await asyncio.sleep(delay)
+            else:
+                print(f"All attempts failed: {str(e)}")
+                return None
+        except Exception as e:
+            print(f"Error searching for videos: {str(e)}")
+            return None
+
+async def _search_segment(session, semaphore, queries, on_url):
+    # Later queries are only tried when the earlier ones find nothing
+    async with semaphore:
+        for query in queries:
+            url = await search_pexels_videos_async(session, query)
+            if url:
+                if on_url:
+                    on_url(url)
+                return url
+    return None
+
+async def search_segments_async(search_queries, on_url=None):
+    """Search every caption segment concurrently and return [time_segment, url] pairs in order.
+
+    on_url is called with each URL as soon as it is found, e.g. to start downloading it.
+    """
+    headers = {
+        'Authorization': PEXELS_API_KEY or '',
+        'User-Agent': USER_AGENT
+    }
+    timeout = aiohttp.ClientTimeout(total=PEXELS_REQUEST_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT,
+                                    sock_read=HTTP_READ_TIMEOUT)
+    connector = aiohttp.TCPConnector(limit=PEXELS_MAX_CONCURRENCY, limit_per_host=HTTP_POOL_PER_HOST)
+    semaphore = asyncio.Semaphore(PEXELS_MAX_CONCURRENCY)
+
+    async with aiohttp.ClientSession(headers=headers, timeout=timeout, connector=connector,
+                                     trace_configs=[aiohttp_trace_config()]) as session:
+        urls = await asyncio.gather(*(_search_segment(session, semaphore, queries, on_url) for _, queries in search_queries))
+
+    return [[time_segment, url] for (time_segment, _), url in zip(search_queries, urls)]
+
+def search_segments(search_queries, on_url=None):
+    """Blocking wrapper around search_segments_async for the synchronous pipeline."""
+    return asyncio.run(search_segments_async(search_queries, on_url))
@@ -1,6 +1,7 @@
 import os 
-import requests
+from utility.http_client import http_get
 from utility.utils import log_response,LOG_TYPE_PEXEL
+from utility.video.search_cache import search_cache, search_cache_key
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -10,8 +11,7 @@ def search_videos(query_string, orientation_landscape=True):
    
     url = "https://api.pexels.com/videos/search"
     headers = {
-        "Authorization": PEXELS_API_KEY,
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+        "Authorization": PEXELS_API_KEY
     }
     params = {
         "query": query_string,
@@ -19,9 +19,16 @@ def search_videos(query_string, orientation_landscape=True):
         "per_page": 15
     }
 
-    response = requests.get(url, headers=headers, params=params)
+    cache_key = search_cache_key(query_string, params["orientation"], params["per_page"])
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    response = http_get(url, headers=headers, params=params)
     json_data = response.json()
-    log_response(LOG_TYPE_PEXEL,query_string,response.json())
+    log_response(LOG_TYPE_PEXEL,query_string,json_data)
+    if response.ok:
+        search_cache.set(cache_key, json_data)
    
     return json_data
 
@@ -0,0 +1,89 @@
+import os
+import subprocess
+from imageio_ffmpeg import get_ffmpeg_exe
+from utility.artifact_cache import artifact_store, artifact_key
+from utility.video.encoder_profiles import encoder_settings, ffmpeg_video_args
+
+# 'ffmpeg' transcodes each clip once with ffmpeg's native scaler;
+# 'pil' resizes every frame in Python as the clip is composited
+VIDEO_RESIZE_MODE = os.getenv('VIDEO_RESIZE_MODE', 'ffmpeg')
+
+def video_encoder_args(encoder):
+    """Codec arguments for normalized segments.
+
+    Segments of one render share these, so they can be joined with the concat
+    demuxer without re-encoding.
+    """
+    return ffmpeg_video_args(encoder) + ['-video_track_timescale', '90000']
+
+def run_ffmpeg(args, description):
+    """Run ffmpeg with the bundled binary, raising RuntimeError with its stderr on failure."""
+    result = subprocess.run([get_ffmpeg_exe(), '-y', '-loglevel', 'error'] + args, capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed to {description}: {result.stderr.decode(errors='replace').strip()}")
+
+def fit_filter(width, height, fps, fit='contain'):
+    """ffmpeg filter chain that fits a clip to width x height at a fixed frame rate.
+
+    'contain' centres the whole clip on black; 'cover' fills the frame and crops the overflow.
+    """
+    if fit == 'cover':
+        return (
+            f"scale={width}:{height}:force_original_aspect_ratio=increase:flags=lanczos,"
+            f"crop={width}:{height},"
+            f"setsar=1,fps={fps}"
+        )
+    return (
+        f"scale={width}:{height}:force_original_aspect_ratio=decrease:flags=lanczos,"
+        f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2:color=black,"
+        f"setsar=1,fps={fps}"
+    )
+
+def normalize_clip(input_path, output_path, width, height, fps, duration, pad_to_duration=False, fit='contain',
+                   encoder=None):
+    """Transcode a clip once to the target size, frame rate and duration, dropping its audio.
+
+    With pad_to_duration a clip shorter than duration is extended with black frames.
+    encoder is a dict from encoder_settings(); the default profile is used when it is None.
+    """
+    encoder = encoder or encoder_settings()
+    video_filter = fit_filter(width, height, fps, fit)
+    if pad_to_duration:
+        video_filter += f",tpad=stop_mode=add:stop_duration={duration:.3f}:color=black"
+    run_ffmpeg([
+        '-i', input_path,
+        '-t', f"{duration:.3f}",
+        '-an',
+        '-vf', video_filter,
+    ] + video_encoder_args(encoder) + [output_path], f"normalize {input_path}")
+    return output_path
+
+def render_black_clip(output_path, width, height, fps, duration, encoder=None):
+    """Encode a black clip with the same codec profile as normalized segments."""
+    encoder = encoder or encoder_settings()
+    run_ffmpeg([
+        '-f', 'lavfi', '-i', f"color=c=black:s={width}x{height}:r={fps}",
+        '-t', f"{duration:.3f}",
+        '-vf', 'setsar=1',
+    ] + video_encoder_args(encoder) + [output_path], "render a black segment")
+    return output_path
+
+def stored_normalized_clip(input_path, width, height, fps, duration, pad_to_duration=False, fit='contain',
+                           encoder=None):
+    """Like normalize_clip, but into the artifact store, so an unchanged segment is only encoded once.
+
+    Returns the stored path, which callers must not modify or delete.
+    """
+    encoder = encoder or encoder_settings()
+    # Stored clips are named by content, so a clip's path and size identify it. The
+    # thread count does not change the picture, so it is left out of the key.
+    key = artifact_key('segment', os.path.abspath(input_path), os.path.getsize(input_path),
+                       width, height, fps, round(duration, 3), pad_to_duration, fit, encoder['preset'], encoder['crf'])
+    return artifact_store.fetch_key(key, lambda path: normalize_clip(
+        input_path, path, width, height, fps, duration, pad_to_duration=pad_to_duration, fit=fit, encoder=encoder))
+
+def stored_black_clip(width, height, fps, duration, encoder=None):
+    """Like render_black_clip, but into the artifact store."""
+    encoder = encoder or encoder_settings()
+    key = artifact_key('black', width, height, fps, round(duration, 3), encoder['preset'], encoder['crf'])
+    return artifact_store.fetch_key(key, lambda path: render_black_clip(path, width, height, fps, duration, encoder))
@@ -0,0 +1,82 @@
+import os
+from moviepy.editor import AudioFileClip
+from utility.video.clip_normalizer import stored_normalized_clip, stored_black_clip, run_ffmpeg
+from utility.video.encoder_profiles import encoder_settings
+
+def segments_overlap(segments):
+    """True if any segment starts before the previous one ends."""
+    previous_end = None
+    for (start_time, end_time), _ in segments:
+        if previous_end is not None and start_time < previous_end - 1e-3:
+            return True
+        previous_end = end_time
+    return False
+
+def get_audio_duration(audio_path):
+    audio = AudioFileClip(audio_path)
+    try:
+        return audio.duration
+    finally:
+        audio.close()
+
+def render_concat(segments, audio_path, output_path, width, height, fps, fetch_clip, work_dir, fit='contain',
+                  encoder=None):
+    """Render consecutive segments by normalizing each one and joining them with the concat demuxer.
+
+    Every segment is encoded with the same codec profile, so the join is a stream
+    copy and only the TTS audio is encoded. Gaps between segments and any audio
+    past the last segment are filled with black. fetch_clip(url) returns a local
+    path for a segment's clip, or None. encoder is a dict from encoder_settings().
+    """
+    encoder = encoder or encoder_settings()
+    audio_duration = get_audio_duration(audio_path)
+
+    # Cut segments on frame boundaries so their lengths add up without drift
+    boundaries = []
+    cursor = 0
+    for (start_time, end_time), url in segments:
+        if start_time > cursor:
+            boundaries.append((cursor, start_time, None))
+        boundaries.append((start_time, end_time, url))
+        cursor = end_time
+    if audio_duration > cursor:
+        boundaries.append((cursor, audio_duration, None))
+
+    parts = []
+    for start_time, end_time, url in boundaries:
+        frames = round(end_time * fps) - round(start_time * fps)
+        if frames <= 0:
+            continue
+        duration = frames / fps
+
+        # Parts come from the artifact store, so a re-render only encodes segments that changed
+        part_path = None
+        video_path = fetch_clip(url) if url else None
+        if video_path:
+            try:
+                part_path = stored_normalized_clip(video_path, width, height, fps, duration, pad_to_duration=True,
+                                                   fit=fit, encoder=encoder)
+            except Exception as e:
+                print(f"Error processing video clip: {str(e)}")
+        if not part_path:
+            part_path = stored_black_clip(width, height, fps, duration, encoder)
+        parts.append(part_path)
+
+    if not parts:
+        raise ValueError("No segments to concatenate")
+
+    list_path = os.path.join(work_dir, "concat.txt")
+    with open(list_path, "w", encoding="utf-8") as f:
+        for part_path in parts:
+            f.write(f"file '{os.path.abspath(part_path)}'\n")
+
+    run_ffmpeg([
+        '-f', 'concat', '-safe', '0', '-i', list_path,
+        '-i', audio_path,
+        '-map', '0:v', '-map', '1:a',
+        '-c:v', 'copy', '-c:a', 'aac', '-b:a', encoder['audio_bitrate'],
+        '-t', f"{audio_duration:.3f}",
+        '-movflags', '+faststart',
+        output_path
+    ], f"concatenate segments into {output_path}")
+    return output_path
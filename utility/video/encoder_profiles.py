@@ -0,0 +1,78 @@
+import os
+
+# Encoder settings a job can be rendered with: name -> x264 preset and CRF,
+# output frame rate and AAC audio bitrate. 'standard' keeps the settings the
+# clip normalizer (and so the concat renderer) already used. It changes the
+# other paths: the moviepy renders used x264's defaults (preset medium, CRF 23)
+# and render_engine wrote 25 fps, where they now get veryfast, CRF 18 and 30 fps.
+ENCODER_PROFILES = {
+    'draft': {'preset': 'ultrafast', 'crf': 28, 'fps': 24, 'audio_bitrate': '96k'},
+    'standard': {'preset': 'veryfast', 'crf': 18, 'fps': 30, 'audio_bitrate': '128k'},
+    'archive': {'preset': 'slow', 'crf': 16, 'fps': 30, 'audio_bitrate': '192k'},
+}
+
+DEFAULT_ENCODER_PROFILE = os.getenv('ENCODER_PROFILE', 'standard')
+# Threads per encode; 0 divides this process's CPUs between the encodes running at once
+ENCODER_THREADS = int(os.getenv('ENCODER_THREADS', 0))
+
+# Renders running at once across the box, set by the job queue or stage scheduler
+_render_concurrency = 1
+
+def set_render_concurrency(renders):
+    """Record how many renders run at once, so encoder threads are shared out between them."""
+    global _render_concurrency
+    _render_concurrency = max(1, int(renders))
+
+def available_cpus():
+    """CPUs this process may use: its affinity mask, capped by a cgroup v2 CPU quota if one is set."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # Not Linux
+        cpus = os.cpu_count() or 1
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()
+        if quota != 'max':
+            cpus = min(cpus, max(1, int(quota) // int(period)))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+def encoder_threads(parallel_encodes=1):
+    """Threads for one encode when parallel_encodes run side by side within each of the concurrent renders."""
+    if ENCODER_THREADS > 0:
+        return ENCODER_THREADS
+    return max(1, available_cpus() // (_render_concurrency * max(1, parallel_encodes)))
+
+def parse_encoder_profile(name=None):
+    """Return a known encoder profile name, defaulting to ENCODER_PROFILE. Raises ValueError otherwise."""
+    if name is None:
+        name = DEFAULT_ENCODER_PROFILE
+    name = str(name).strip().lower()
+    if name not in ENCODER_PROFILES:
+        raise ValueError(f"Unknown encoder profile '{name}'; choose from {', '.join(ENCODER_PROFILES)}")
+    return name
+
+def encoder_settings(name=None, parallel_encodes=1):
+    """The named profile's settings plus its name and a thread count for this process."""
+    name = parse_encoder_profile(name)
+    return dict(ENCODER_PROFILES[name], name=name, threads=encoder_threads(parallel_encodes))
+
+def ffmpeg_video_args(encoder):
+    """x264 output arguments for an ffmpeg command line."""
+    return [
+        '-c:v', 'libx264', '-preset', encoder['preset'], '-crf', str(encoder['crf']), '-pix_fmt', 'yuv420p',
+        '-threads', str(encoder['threads'])
+    ]
+
+def write_videofile_args(encoder, fps=None):
+    """Keyword arguments for moviepy's write_videofile."""
+    return {
+        'fps': fps or encoder['fps'],
+        'codec': 'libx264',
+        'preset': encoder['preset'],
+        'threads': encoder['threads'],
+        'audio_codec': 'aac',
+        'audio_bitrate': encoder['audio_bitrate'],
+        'ffmpeg_params': ['-crf', str(encoder['crf']), '-pix_fmt', 'yuv420p'],
+    }
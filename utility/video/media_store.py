@@ -0,0 +1,176 @@
+import os
+import re
+import time
+import shutil
+import logging
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: atomic renames still keep the store consistent
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+MEDIA_STORE_DIR = os.getenv('MEDIA_STORE_DIR', '.cache/media')
+MEDIA_STORE_QUOTA_MB = int(os.getenv('MEDIA_STORE_QUOTA_MB', 5120))
+MEDIA_STORE_MIN_AGE = 600  # seconds; recently used clips may still be open by a render
+# seconds between walks of the store to pick up what other processes wrote;
+# in between, each process keeps a running total of its own writes
+MEDIA_STORE_RESCAN_INTERVAL = 60
+
+# Pexels CDN links carry the video ID and rendition in the path, plus signing
+# parameters that change between searches
+PEXELS_VIDEO_FILE_PATTERN = re.compile(r'/video-files/(\d+)/([^/?#]+)')
+
+def media_key(url):
+    """Content address for a clip: the Pexels video ID and rendition when present, else the full URL."""
+    match = PEXELS_VIDEO_FILE_PATTERN.search(url)
+    identity = f"pexels:{match.group(1)}/{match.group(2)}" if match else url
+    return hashlib.sha256(identity.encode('utf-8')).hexdigest()
+
+class MediaStore:
+    """Local store of downloaded stock clips with a disk quota and LRU eviction.
+
+    Files are written to a temporary name and renamed into place, so concurrent
+    workers only ever see complete clips.
+    """
+
+    def __init__(self, root, quota_bytes, label="clip"):
+        self.root = root
+        self.quota_bytes = quota_bytes
+        self.label = label
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.bytes_downloaded = 0
+        # Bytes stored as of the last walk plus this process's writes since; None until walked
+        self.total_bytes = None
+        self.scanned_at = 0.0
+
+    def path_for(self, key, suffix='.mp4'):
+        return os.path.join(self.root, key[:2], key + suffix)
+
+    @contextmanager
+    def _key_lock(self, path):
+        # Serialise downloads of the same clip across worker processes
+        if fcntl is None:
+            yield
+            return
+        with open(path + '.lock', 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _hit(self, path):
+        size = os.path.getsize(path)
+        os.utime(path)  # Mark as recently used for LRU eviction
+        with self.lock:
+            self.hits += 1
+            self.bytes_saved += size
+        logger.debug(f"Reusing stored {self.label} {os.path.basename(path)} ({size} bytes saved)")
+        return path
+
+    def fetch(self, url, download):
+        """Return a local path for url, calling download(url, path) only if the clip is not stored yet."""
+        return self.fetch_key(media_key(url), lambda path: download(url, path))
+
+    def fetch_key(self, key, produce, suffix='.mp4'):
+        """Return the stored file for key, calling produce(path) to write it only if it is not stored yet."""
+        path = self.path_for(key, suffix)
+        if os.path.exists(path):
+            return self._hit(path)
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._key_lock(path):
+            # Another worker may have finished the download while we waited
+            if os.path.exists(path):
+                return self._hit(path)
+
+            # Keep the real suffix last so tools that go by extension, like ffmpeg, can write the file
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.part' + suffix)
+            os.close(fd)
+            try:
+                produce(temp_path)
+                os.replace(temp_path, path)
+            except Exception:
+                if os.path.exists(temp_path):
+                    os.unlink(temp_path)
+                raise
+
+        size = os.path.getsize(path)
+        with self.lock:
+            self.misses += 1
+            self.bytes_downloaded += size
+            if self.total_bytes is not None:
+                self.total_bytes += size
+            due = (self.total_bytes is None or self.total_bytes > self.quota_bytes
+                   or time.monotonic() - self.scanned_at >= MEDIA_STORE_RESCAN_INTERVAL)
+        if due:
+            self.evict()
+        return path
+
+    def lookup(self, key, suffix='.mp4'):
+        """The stored file for key, or None if it is not stored."""
+        path = self.path_for(key, suffix)
+        if os.path.exists(path):
+            return self._hit(path)
+        return None
+
+    def put(self, key, source_path, suffix='.mp4'):
+        """Store a copy of source_path under key and return the stored path."""
+        return self.fetch_key(key, lambda path: shutil.copyfile(source_path, path), suffix)
+
+    def evict(self):
+        """Remove least recently used clips until the store fits its quota.
+
+        Walks the whole store, so writes only call it when the running total
+        is over quota or MEDIA_STORE_RESCAN_INTERVAL has passed.
+        """
+        files = []
+        total = 0
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.endswith('.lock') or '.part' in filename:
+                    continue
+                path = os.path.join(directory, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+        cutoff = time.time() - MEDIA_STORE_MIN_AGE
+        for mtime, size, path in sorted(files):
+            if total <= self.quota_bytes:
+                break
+            if mtime > cutoff:
+                break
+            try:
+                os.unlink(path)
+                total -= size
+                if os.path.exists(path + '.lock'):
+                    os.unlink(path + '.lock')
+            except FileNotFoundError:
+                pass
+        with self.lock:
+            self.total_bytes = total
+            self.scanned_at = time.monotonic()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "bytes_saved": self.bytes_saved,
+                "bytes_downloaded": self.bytes_downloaded
+            }
+
+media_store = MediaStore(MEDIA_STORE_DIR, MEDIA_STORE_QUOTA_MB * 1024 * 1024)
@@ -0,0 +1,39 @@
+import os
+
+# Output formats a job can be rendered in: name -> (width, height, fit).
+# 'contain' letterboxes each clip inside the frame; 'cover' scales it up and
+# crops, which suits the mostly landscape stock footage in tall or square frames.
+RENDER_PROFILES = {
+    'landscape': (1280, 720, 'contain'),
+    'portrait': (720, 1280, 'cover'),
+    'square': (1080, 1080, 'cover'),
+}
+
+DEFAULT_RENDER_PROFILES = os.getenv('RENDER_PROFILES', 'landscape')
+# Profiles of one job rendered at the same time; each runs its own ffmpeg processes
+RENDER_PROFILE_WORKERS = int(os.getenv('RENDER_PROFILE_WORKERS', 3))
+
+def parse_render_profiles(profiles=None):
+    """Return profile names from a list or comma-separated string, in order and without duplicates.
+
+    Raises ValueError for unknown names.
+    """
+    if profiles is None:
+        profiles = DEFAULT_RENDER_PROFILES
+    if isinstance(profiles, str):
+        profiles = profiles.split(',')
+    if not isinstance(profiles, (list, tuple)):
+        raise ValueError("Render profiles must be a list or a comma-separated string of names")
+    names = []
+    for name in profiles:
+        if not isinstance(name, str):
+            raise ValueError(f"Render profile names must be strings, not {name!r}")
+        name = name.strip().lower()
+        if not name or name in names:
+            continue
+        if name not in RENDER_PROFILES:
+            raise ValueError(f"Unknown render profile '{name}'; choose from {', '.join(RENDER_PROFILES)}")
+        names.append(name)
+    if not names:
+        raise ValueError("At least one render profile is required")
+    return names
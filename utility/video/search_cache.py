@@ -0,0 +1,17 @@
+import os
+import json
+import hashlib
+from utility.disk_cache import DiskCache
+
+SEARCH_CACHE_PATH = os.getenv('SEARCH_CACHE_PATH', '.cache/search_cache.sqlite3')
+SEARCH_CACHE_TTL = int(os.getenv('SEARCH_CACHE_TTL', 24 * 60 * 60))  # seconds
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv('SEARCH_CACHE_MAX_ENTRIES', 10000))
+
+# Pexels search responses shared by every search function and worker process
+search_cache = DiskCache(SEARCH_CACHE_PATH, ttl=SEARCH_CACHE_TTL, max_entries=SEARCH_CACHE_MAX_ENTRIES)
+
+def search_cache_key(query, orientation=None, per_page=None):
+    """Content address for a search: hash of the normalized query, orientation and page size."""
+    normalized_query = ' '.join(query.lower().split())
+    payload = json.dumps([normalized_query, orientation, per_page])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
@@ -0,0 +1,88 @@
+import numpy as np
+from moviepy.editor import AudioFileClip, VideoClip, VideoFileClip
+from utility.video.clip_normalizer import stored_normalized_clip
+from utility.video.encoder_profiles import encoder_settings, write_videofile_args
+
+class SegmentReader:
+    """A segment's clip, normalized and opened on first use and closed once rendering has moved past it."""
+
+    def __init__(self, start_time, end_time, url, fetch_clip, width, height, fps, fit, encoder):
+        self.start_time = start_time
+        self.end_time = end_time
+        self.url = url
+        self.fetch_clip = fetch_clip
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.fit = fit
+        self.encoder = encoder
+        self.clip = None
+        self.failed = False
+
+    def _open(self):
+        video_path = self.fetch_clip(self.url)
+        if not video_path:
+            raise ValueError(f"No clip downloaded for {self.url}")
+        # Normalized segments are kept in the artifact store for later renders of the same segment
+        normalized_path = stored_normalized_clip(video_path, self.width, self.height, self.fps,
+                                                 self.end_time - self.start_time, pad_to_duration=True, fit=self.fit,
+                                                 encoder=self.encoder)
+        return VideoFileClip(normalized_path, audio=False)
+
+    def frame(self, t):
+        """Frame at absolute time t, or None if the clip cannot be used."""
+        if self.failed:
+            return None
+        if self.clip is None:
+            try:
+                self.clip = self._open()
+            except Exception as e:
+                print(f"Error processing video clip: {str(e)}")
+                self.failed = True
+                return None
+        return self.clip.get_frame(min(t - self.start_time, self.clip.duration - 1 / self.fps))
+
+    def close(self):
+        if self.clip is not None:
+            self.clip.close()
+            self.clip = None
+
+def render_streaming(segments, audio_path, output_path, width, height, fps, fetch_clip, fit='contain', encoder=None):
+    """Composite segments frame by frame, keeping only the segment on screen open.
+
+    Produces the same picture as stacking every segment in a CompositeVideoClip,
+    where later segments cover earlier ones, but each segment's ffmpeg reader
+    exists only while its time window is being encoded. Memory and open
+    processes therefore stay flat however many segments there are.
+    fetch_clip(url) returns a local path for a segment's clip, or None.
+    encoder is a dict from encoder_settings().
+    """
+    encoder = encoder or encoder_settings()
+    readers = [
+        SegmentReader(start_time, end_time, url, fetch_clip, width, height, fps, fit, encoder)
+        for (start_time, end_time), url in segments if url
+    ]
+    black = np.zeros((height, width, 3), dtype=np.uint8)
+
+    def make_frame(t):
+        # Frames are requested in time order while writing, so anything that has
+        # ended can be closed
+        frame = None
+        for reader in reversed(readers):
+            if reader.end_time <= t:
+                reader.close()
+            elif frame is None and reader.start_time <= t:
+                frame = reader.frame(t)
+        return black if frame is None else frame
+
+    audio = AudioFileClip(audio_path)
+    video = VideoClip(make_frame, duration=audio.duration)
+    try:
+        video = video.set_audio(audio)
+        video.write_videofile(output_path, **write_videofile_args(encoder, fps))
+    finally:
+        for reader in readers:
+            reader.close()
+        video.close()
+        audio.close()
+    return output_path
@@ -1,12 +1,27 @@
 import os
-import requests
-from moviepy.editor import ImageClip, concatenate_videoclips, AudioFileClip, CompositeVideoClip, VideoFileClip, ColorClip
+import shutil
+from moviepy.editor import ImageClip, AudioFileClip, CompositeVideoClip, VideoFileClip, ColorClip
 import numpy as np
 from PIL import Image
 import io
 import tempfile
-import urllib.request
-import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from utility.http_client import http_get, count_requests
+from utility.video.media_store import media_store
+from utility.video.clip_normalizer import normalize_clip, VIDEO_RESIZE_MODE
+from utility.video.concat_renderer import render_concat, segments_overlap
+from utility.video.streaming_renderer import render_streaming
+from utility.video.render_profiles import RENDER_PROFILES, RENDER_PROFILE_WORKERS
+from utility.video.encoder_profiles import encoder_settings, write_videofile_args
+
+# 'auto' joins non-overlapping segments with the fast concat renderer and
+# streams the rest, one open segment at a time; 'concat', 'stream' and
+# 'composite' (every clip open in one CompositeVideoClip) force a renderer
+VIDEO_RENDERER = os.getenv('VIDEO_RENDERER', 'auto')
+
+PREFETCH_WORKERS = int(os.getenv('PREFETCH_WORKERS', 4))
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024  # 1 MB
 
 def resize_frame(frame, size):
     """Resize a frame using PIL with the correct resampling filter."""
@@ -22,7 +37,7 @@ def resize_frame(frame, size):
 def download_image(url):
     """Download an image from a URL and return it as a numpy array."""
     try:
-        response = requests.get(url)
+        response = http_get(url)
         response.raise_for_status()
         image = Image.open(io.BytesIO(response.content))
         # Convert to RGB if necessary
@@ -34,39 +49,70 @@ def download_image(url):
         # Return a black image as fallback
         return np.zeros((720, 1280, 3), dtype=np.uint8)
 
-def download_video(url):
-    """Download a video from a URL and return the local file path."""
-    try:
-        # Create a temporary file
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4')
-        temp_path = temp_file.name
-        temp_file.close()
-        
-        # Download with proper headers
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        
-        response = requests.get(url, headers=headers, stream=True)
+def _download_to(url, path):
+    """Stream a URL to a local path over the shared pooled session."""
+    with http_get(url, stream=True) as response:
         response.raise_for_status()
         
-        # Write the video data to the temporary file
-        with open(temp_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
+        # Write the video data to the file
+        with open(path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
                 if chunk:
                     f.write(chunk)
-        
-        return temp_path
+
+def download_video(url):
+    """Download a video from a URL into the media store and return the local file path."""
+    try:
+        return media_store.fetch(url, _download_to)
     except Exception as e:
         print(f"Error downloading video from {url}: {str(e)}")
-        if 'temp_path' in locals() and os.path.exists(temp_path):
-            try:
-                os.unlink(temp_path)
-            except:
-                pass
         return None
 
-def create_video_from_photos(segments, audio_path, output_path, width=1280, height=720):
+class ClipPrefetcher:
+    """Downloads segment clips on a bounded thread pool as soon as their URLs are known."""
+
+    def __init__(self, max_workers=PREFETCH_WORKERS):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self.futures = {}
+        self.lock = threading.Lock()
+        # Outbound HTTP of this prefetcher's downloads, whichever thread made them
+        self.http = {'requests': 0, 'new_connections': 0, 'retries': 0}
+
+    def _download(self, url):
+        with count_requests(self.http):
+            return download_video(url)
+
+    def prefetch(self, url):
+        """Start downloading url in the background unless it is already queued."""
+        if not url:
+            return
+        with self.lock:
+            if url not in self.futures:
+                self.futures[url] = self.executor.submit(self._download, url)
+
+    def get(self, url):
+        """Wait for url's download and return its local path, or None if it failed."""
+        self.prefetch(url)
+        with self.lock:
+            future = self.futures[url]
+        return future.result()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+class LocalClips:
+    """Stands in for a ClipPrefetcher when every clip is already on disk."""
+
+    def __init__(self, paths):
+        self.paths = paths
+
+    def prefetch(self, url):
+        pass
+
+    def get(self, url):
+        return self.paths.get(url)
+
+def create_video_from_photos(segments, audio_path, output_path, width=1280, height=720, encoder=None):
     """Create a video from a list of photo URLs and timing information."""
     
     if not segments:
@@ -122,7 +168,7 @@ def create_video_from_photos(segments, audio_path, output_path, width=1280, heig
     final_video = final_video.set_duration(audio.duration)
     
     # Write the output file
-    final_video.write_videofile(output_path, fps=30, codec='libx264', audio_codec='aac')
+    final_video.write_videofile(output_path, **write_videofile_args(encoder or encoder_settings()))
     
     # Clean up
     final_video.close()
@@ -130,58 +176,111 @@ def create_video_from_photos(segments, audio_path, output_path, width=1280, heig
     for clip in clips:
         clip.close()
 
-def create_video_from_videos(segments, audio_path, output_path, width=1280, height=720):
-    """Create a video from a list of video URLs and timing information."""
+def load_normalized_clip(video_path, work_dir, index, width, height, fps, duration, fit='contain', encoder=None):
+    """Transcode a clip to the output format with ffmpeg and open it, or return None if ffmpeg fails."""
+    normalized_path = os.path.join(work_dir, f"segment_{index:04d}.mp4")
+    try:
+        normalize_clip(video_path, normalized_path, width, height, fps, duration, fit=fit, encoder=encoder)
+    except Exception as e:
+        print(f"Falling back to frame-by-frame resize: {str(e)}")
+        return None
+    return VideoFileClip(normalized_path)
+
+def load_resized_clip(video_path, width, height, duration):
+    """Open a clip and resize every frame with PIL as it is composited."""
+    clip = VideoFileClip(video_path)
+    
+    # Trim the clip to the required duration
+    if clip.duration > duration:
+        clip = clip.subclip(0, duration)
+    
+    # Calculate resize dimensions while maintaining aspect ratio
+    clip_aspect = clip.size[0] / clip.size[1]
+    target_aspect = width / height
+    
+    if clip_aspect > target_aspect:
+        # Video is wider than target
+        new_width = width
+        new_height = int(width / clip_aspect)
+    else:
+        # Video is taller than target
+        new_height = height
+        new_width = int(height * clip_aspect)
+    
+    # Create a custom resize function using PIL's Lanczos filter
+    clip = clip.fl_image(lambda frame: resize_frame(frame, (new_width, new_height)))
+    
+    # Center the clip
+    x_offset = (width - new_width) // 2
+    y_offset = (height - new_height) // 2
+    return clip.set_position((x_offset, y_offset))
+
+def create_video_from_videos(segments, audio_path, output_path, width=1280, height=720, prefetcher=None,
+                             fps=None, resize_mode=VIDEO_RESIZE_MODE, renderer=VIDEO_RENDERER, fit='contain',
+                             encoder=None):
+    """Create a video from a list of video URLs and timing information.
+
+    Clips are taken from prefetcher when one is given; otherwise every segment's
+    download is started up front so they overlap with clip construction.
+    Non-overlapping segments are joined with the concat renderer, and other
+    segments go through the streaming renderer, unless renderer is 'composite'
+    or resize_mode is 'pil'. When compositing, resize_mode 'ffmpeg' transcodes each clip
+    once to the output size and frame rate; 'pil' resizes frame by frame instead.
+    fit is 'contain' or 'cover' (see fit_filter); the 'pil' path always contains.
+    encoder is a dict from encoder_settings() (default ENCODER_PROFILE); fps
+    defaults to the encoder profile's frame rate. Returns output_path, or None
+    if no video could be rendered; output_path may then hold a partial file.
+    """
     
     if not segments:
         print("No segments provided")
-        return
+        return None
     
+    encoder = encoder or encoder_settings()
+    fps = fps or encoder['fps']
     clips = []
-    temp_files = []  # To keep track of temporary files for cleanup
+    work_dir = tempfile.mkdtemp(prefix="segments_")
+    own_prefetcher = prefetcher is None
+    if own_prefetcher:
+        prefetcher = ClipPrefetcher()
+    for _, url in segments:
+        prefetcher.prefetch(url)
     
     try:
+        if renderer in ('auto', 'concat') and not segments_overlap(segments):
+            try:
+                render_concat(segments, audio_path, output_path, width, height, fps, prefetcher.get, work_dir, fit,
+                              encoder)
+                return output_path
+            except Exception as e:
+                print(f"Fast concat render failed, falling back to frame-by-frame rendering: {str(e)}")
+        
+        if renderer in ('auto', 'stream') and resize_mode == 'ffmpeg':
+            try:
+                render_streaming(segments, audio_path, output_path, width, height, fps, prefetcher.get, fit, encoder)
+                return output_path
+            except Exception as e:
+                print(f"Streaming render failed, falling back to compositing: {str(e)}")
+        
         for segment in segments:
             timing, url = segment
             start_time, end_time = timing
             duration = end_time - start_time
             
             if url:
-                # Download and process the video
-                video_path = download_video(url)
+                # Wait for the prefetched download and process the video
+                video_path = prefetcher.get(url)
                 if video_path:
-                    temp_files.append(video_path)
                     try:
-                        clip = VideoFileClip(video_path)
-                        
-                        # Trim the clip to the required duration
-                        if clip.duration > duration:
-                            clip = clip.subclip(0, duration)
-                        
-                        # Calculate resize dimensions while maintaining aspect ratio
-                        clip_aspect = clip.size[0] / clip.size[1]
-                        target_aspect = width / height
-                        
-                        if clip_aspect > target_aspect:
-                            # Video is wider than target
-                            new_width = width
-                            new_height = int(width / clip_aspect)
-                        else:
-                            # Video is taller than target
-                            new_height = height
-                            new_width = int(height * clip_aspect)
-                        
-                        # Create a custom resize function using PIL's Lanczos filter
-                        clip = clip.fl_image(lambda frame: resize_frame(frame, (new_width, new_height)))
+                        clip = None
+                        if resize_mode == 'ffmpeg':
+                            clip = load_normalized_clip(video_path, work_dir, len(clips), width, height, fps, duration,
+                                                        fit, encoder)
+                        if clip is None:
+                            clip = load_resized_clip(video_path, width, height, duration)
                         
                         # Set the start time
                         clip = clip.set_start(start_time)
-                        
-                        # Center the clip
-                        x_offset = (width - new_width) // 2
-                        y_offset = (height - new_height) // 2
-                        clip = clip.set_position((x_offset, y_offset))
-                        
                         clips.append(clip)
                     except Exception as e:
                         print(f"Error processing video clip: {str(e)}")
@@ -199,7 +298,7 @@ def create_video_from_videos(segments, audio_path, output_path, width=1280, heig
         
         if not clips:
             print("No valid clips to create video")
-            return
+            return None
         
         # Create a black background clip
         background = ColorClip(size=(width, height), color=(0, 0, 0))
@@ -215,11 +314,15 @@ def create_video_from_videos(segments, audio_path, output_path, width=1280, heig
         final_video = final_video.set_duration(audio.duration)
         
         # Write the output file
-        final_video.write_videofile(output_path, fps=30, codec='libx264', audio_codec='aac')
+        final_video.write_videofile(output_path, **write_videofile_args(encoder, fps))
+        return output_path
         
     except Exception as e:
         print(f"Error creating video: {str(e)}")
+        return None
     finally:
+        if own_prefetcher:
+            prefetcher.shutdown()
         # Clean up
         for clip in clips:
             try:
@@ -231,9 +334,38 @@ def create_video_from_videos(segments, audio_path, output_path, width=1280, heig
                 audio.close()
             except:
                 pass
-        # Remove temporary files
-        for temp_file in temp_files:
-            try:
-                os.unlink(temp_file)
-            except:
-                pass 
\ No newline at end of file
+        # Remove normalized segment files
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def render_all_profiles(segments, audio_path, output_dir, profiles, clip_paths, encoder_profile=None):
+    """Render segments once per render profile, in parallel, and return {profile: output path}.
+
+    clip_paths maps each segment URL to its downloaded file, and every profile
+    is encoded with the named encoder profile. Arguments and result are plain
+    data, so this can run in a worker process.
+    """
+    clips = LocalClips(clip_paths)
+    parallel = max(1, min(RENDER_PROFILE_WORKERS, len(profiles)))
+    # Profiles encoded side by side share this process's share of the CPUs
+    encoder = encoder_settings(encoder_profile, parallel_encodes=parallel)
+
+    def render(profile):
+        width, height, fit = RENDER_PROFILES[profile]
+        output_path = os.path.join(output_dir, f"rendered_video_{profile}.mp4")
+        # A failed attempt can leave a partial file, so only a successful render is moved into place
+        temp_path = os.path.join(output_dir, f"rendered_video_{profile}.part.mp4")
+        try:
+            rendered = create_video_from_videos(segments, audio_path, temp_path, width=width, height=height,
+                                                prefetcher=clips, fit=fit, encoder=encoder)
+            if rendered is None or not os.path.exists(temp_path):
+                raise RuntimeError(f"No video was rendered for profile {profile}")
+            os.replace(temp_path, output_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+        return output_path
+
+    # Every profile reuses the same audio and downloaded clips
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        paths = list(executor.map(render, profiles))
+    return dict(zip(profiles, paths))
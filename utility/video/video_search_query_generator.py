@@ -4,6 +4,8 @@ import json
 import re
 from datetime import datetime
 from utility.utils import log_response,LOG_TYPE_GPT
+from utility.video.search_cache import search_cache, search_cache_key
+from utility.http_client import http_get
 import requests
 from dotenv import load_dotenv
 import time
@@ -57,58 +59,66 @@ PEXELS_API_KEY = os.getenv('PEXELS_KEY')
 RATE_LIMIT_DELAY = 2  # Increased delay to 2 seconds between requests
 MAX_RETRIES = 3  # Maximum number of retries for failed requests
 
+def clean_search_query(query):
+    """Drop short words from a search query, falling back to a generic query."""
+    query = ' '.join(word for word in query.split() if len(word) > 2)
+    if not query:
+        query = "nature"  # fallback query
+    return query
+
+def pick_video_link(data):
+    """Pick the best-quality (Full HD or lower) file link from a Pexels search response."""
+    if data.get('videos'):
+        # Get the video with the best quality
+        video = data['videos'][0]
+        video_files = sorted(
+            video['video_files'],
+            key=lambda x: (x.get('width', 0) * x.get('height', 0)),
+            reverse=True
+        )
+        
+        # Try to find a suitable quality video (HD or lower)
+        for video_file in video_files:
+            if video_file.get('width', 0) <= 1920:  # Max Full HD
+                return video_file['link']
+        
+        # If no suitable quality found, use the lowest quality
+        return video_files[-1]['link']
+            
+    return None
+
 def search_pexels_videos(query, per_page=1):
     """Search for videos on Pexels with rate limiting and retries."""
     headers = {
-        'Authorization': PEXELS_API_KEY,
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+        'Authorization': PEXELS_API_KEY
     }
     
     # Clean up the query
-    query = ' '.join(word for word in query.split() if len(word) > 2)
-    if not query:
-        query = "nature"  # fallback query
+    query = clean_search_query(query)
     
-    url = f'https://api.pexels.com/videos/search?query={query}&per_page={per_page}'
+    cache_key = search_cache_key(query, per_page=per_page)
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        return pick_video_link(cached)
     
-    for attempt in range(MAX_RETRIES):
-        try:
-            # Add delay for rate limiting
-            time.sleep(RATE_LIMIT_DELAY)
-            
-            response = requests.get(url, headers=headers)
-            response.raise_for_status()
-            data = response.json()
-            
-            if data.get('videos'):
-                # Get the video with the best quality
-                video = data['videos'][0]
-                video_files = sorted(
-                    video['video_files'],
-                    key=lambda x: (x.get('width', 0) * x.get('height', 0)),
-                    reverse=True
-                )
-                
-                # Try to find a suitable quality video (HD or lower)
-                for video_file in video_files:
-                    if video_file.get('width', 0) <= 1920:  # Max Full HD
-                        return video_file['link']
-                
-                # If no suitable quality found, use the lowest quality
-                return video_files[-1]['link']
-                    
-            return None
-            
-        except requests.exceptions.RequestException as e:
-            if attempt < MAX_RETRIES - 1:
-                print(f"Attempt {attempt + 1} failed: {str(e)}. Retrying...")
-                time.sleep(RATE_LIMIT_DELAY * 2)  # Double the delay on retry
-            else:
-                print(f"All attempts failed: {str(e)}")
-                return None
-        except Exception as e:
-            print(f"Error searching for videos: {str(e)}")
-            return None
+    try:
+        # Add delay for rate limiting
+        time.sleep(RATE_LIMIT_DELAY)
+        
+        # The shared client retries 429 and 5xx responses and connection errors
+        response = http_get('https://api.pexels.com/videos/search', headers=headers,
+                            params={'query': query, 'per_page': per_page}, retries=MAX_RETRIES - 1)
+        response.raise_for_status()
+        data = response.json()
+        search_cache.set(cache_key, data)
+        return pick_video_link(data)
+        
+    except requests.exceptions.RequestException as e:
+        print(f"All attempts failed: {str(e)}")
+        return None
+    except Exception as e:
+        print(f"Error searching for videos: {str(e)}")
+        return None
 
 def getVideoSearchQueriesTimed(script, captions_timed):
     """Generate search queries for each caption segment."""